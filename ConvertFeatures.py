@@ -1,11 +1,15 @@
 import numpy as np
 import sys
+import zlib
+from array import array
+import scipy.sparse
 from collections import Counter
 count = Counter()
 all_tags = {}
 feature_map = {}
 count_feature = {}
 not_rare_words = set()
+hash_buckets = None  # a number of buckets switches to the hashing trick instead of feature_map
 from utils import write_to_file
 
 
@@ -18,6 +22,124 @@ def create_dicts(input_file_name):
                 feature_map[featur] = (len(feature_map))
 
 
+def feature_strings(feature):
+    # the same "feature_number_i=value" names convert_to_text writes
+    return ["feature_number_" + str(i) + "=" + str(fe) for i, fe in enumerate(feature)]
+
+
+def feature_ids(feature, feature_dict, grow=False, outside=None):
+    if hasattr(feature_dict, "lookup"):
+        # compiled, read only feature map
+        names = feature_strings(feature)
+        ids = feature_dict.lookup(names)
+        if outside is not None:
+            outside.extend([f for f, i in zip(names, ids) if i < 0])
+        return sorted([i for i in ids if i >= 0])
+    feature_index_per_word = []
+    for f in feature_strings(feature):
+        if f in feature_dict:
+            feature_index_per_word.append(feature_dict[f])
+        elif grow:
+            feature_dict[f] = len(feature_dict)
+            feature_index_per_word.append(feature_dict[f])
+        elif outside is not None:
+            outside.append(f)
+    return sorted(feature_index_per_word)
+
+
+class HashingFeatureMap(object):
+    # signed hashing trick, nothing to build, save or load and unseen
+    # features at predict time simply land in some bucket
+    def __init__(self, n_buckets):
+        self.n_buckets = n_buckets
+
+    def __len__(self):
+        return self.n_buckets
+
+    def vectorize(self, names):
+        row = {}
+        for name in names:
+            h = zlib.crc32(name.encode("utf-8"))
+            index = h % self.n_buckets
+            row[index] = row.get(index, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+        ids = sorted([i for i in row if row[i] != 0])
+        return ids, [row[i] for i in ids]
+
+
+def feature_row(feature, feature_dict, grow=False, outside=None):
+    # (ids, values) of one candidate, values is None when they are all 1
+    if isinstance(feature_dict, HashingFeatureMap):
+        return feature_dict.vectorize(feature_strings(feature))
+    return feature_ids(feature, feature_dict, grow, outside), None
+
+
+def training_feature_map():
+    if hash_buckets:
+        return HashingFeatureMap(hash_buckets)
+    return feature_map
+
+
+class FeatureMatrixBuilder(object):
+    # collects rows of feature ids straight into CSR arrays
+    def __init__(self):
+        self.indptr = array('i', [0])
+        self.indices = array('i')
+        self.data = array('d')
+        self.labels = array('d')
+
+    def __len__(self):
+        return len(self.labels)
+
+    def add_row(self, ids, label=0, values=None):
+        self.indices.extend(ids)
+        if values is None:
+            self.data.extend([1.0] * len(ids))
+        else:
+            self.data.extend(values)
+        self.indptr.append(len(self.indices))
+        self.labels.append(label)
+
+    def to_csr(self, num_features):
+        indices = np.frombuffer(self.indices, dtype=np.int32)
+        indptr = np.frombuffer(self.indptr, dtype=np.int32)
+        data = np.frombuffer(self.data, dtype=np.float64)
+        matrix = scipy.sparse.csr_matrix((data, indices, indptr), shape=(len(self.labels), num_features))
+        return matrix, np.frombuffer(self.labels, dtype=np.float64)
+
+    def to_svmlight_lines(self):
+        lines = []
+        for row in range(len(self.labels)):
+            string_of_line = str(int(self.labels[row]))
+            for k in range(self.indptr[row], self.indptr[row + 1]):
+                string_of_line += " " + str(self.indices[k]) + ":" + "%g" % self.data[k]
+            lines.append(string_of_line + "\n")
+        if lines:
+            lines[-1] = lines[-1][:-1]
+        return lines
+
+
+def aggregate_rows(X, y, sample_weight=None):
+    # identical (label, ids, values) rows collapsed into the first of them, the weight
+    # is how many there were (or the sum of their sample_weight)
+    X = scipy.sparse.csr_matrix(X)
+    X.sort_indices()
+    y = np.asarray(y)
+    weights = np.ones(len(y)) if sample_weight is None else np.asarray(sample_weight, dtype=np.float64)
+    first_row = {}
+    keep = []
+    unique_weights = []
+    for row in range(X.shape[0]):
+        start, end = X.indptr[row], X.indptr[row + 1]
+        key = (y[row], X.indices[start:end].tobytes(), X.data[start:end].tobytes())
+        if key in first_row:
+            unique_weights[first_row[key]] += weights[row]
+        else:
+            first_row[key] = len(keep)
+            keep.append(row)
+            unique_weights.append(weights[row])
+    return X[keep], y[keep], np.array(unique_weights, dtype=np.float64)
+
+
 def list_of_index(line,feature_dict):
     feature_index_per_word = []
     features = line.strip().split(" ")
@@ -83,12 +205,9 @@ def append_set_to_file(file_name,s,command = "a"):
 
 
 def write_dict_to_file(file_name, d , command = "w"):
-        f = open(file_name, command)
         text = []
         for i,key in enumerate(d):
              string =  str(key) + " "+ str(d[key]) + "\n"
-             if d[key] == 1:
-                 print
              text.append(string)
 
 
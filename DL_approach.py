@@ -1,17 +1,13 @@
 import pickle
-from nltk.tag.stanford import StanfordNERTagger
 import evaluate_result
 from utils import *
+from corpus import load_corpus
 import ConvertFeatures
 import TrainSolver
 import Predict
 
 import mlp
 
-st = StanfordNERTagger(
-    '/Users/ofersabo/PycharmProjects/NLP_A4/stanford-ner-2018-10-16/classifiers/english.all.3class.distsim.crf.ser.gz',
-    '/Users/ofersabo/PycharmProjects/NLP_A4/stanford-ner-2018-10-16/stanford-ner.jar')
-
 train_text = "data/Corpus.TRAIN.txt"
 dev_text = "data/Corpus.DEV.txt"
 processed_train = "data/Corpus.TRAIN.processed"
@@ -25,6 +21,7 @@ stanford_TRAIN_ner_pickle = "stnaford_ner.pickle"
 stanford_DEV_ner_pickle = "DEV_STANFORD_NER"
 combind_sentences_pickle = "combined_dict.pickle"
 Mr_Mrs = set(['Mrs.', 'Ms.'])
+location_tags = ("GPE", "NORP")
 
 
 def save_to_file(var, file_name):
@@ -39,58 +36,6 @@ def load_from_file(file_name):
     return var
 
 
-def convert_sentences_to_tokens(file_name):
-    sentences = {}
-    last_line_is_blank = True
-    for i, line in enumerate(open(file_name)):
-        line = line.strip().replace("\t", " ").split()
-        if last_line_is_blank:
-            last_line_is_blank = False
-            sen_num = line[-1]
-            sentences[sen_num] = []
-            this_sentence = sentences[sen_num]
-            continue
-        elif len(line) == 0:
-            last_line_is_blank = True
-            continue
-        elif line[0].isdigit():
-            word = line[1]
-            this_sentence.append(word)
-
-    return sentences
-
-
-def processed_text_to_dict(file_name):
-    sentence_dict = {}
-    last_line_is_blank = True
-    for i, line in enumerate(open(file_name)):
-        line = line.strip().replace("\t", " ").split()
-        if last_line_is_blank:
-            last_line_is_blank = False
-            sen_num = line[-1]
-            sentence_dict[sen_num] = sentence_dict.get(sen_num, list())
-            this_sentence = sentence_dict[sen_num]
-            continue
-        elif len(line) == 0:
-            last_line_is_blank = True
-            continue
-        elif line[0].isdigit():
-            word = line[1]
-            ner = line[-1]
-            if ner == "GPE" or ner == "NORP": ner = "LOCATION"
-            if line[3] == 'POS':
-                ner = 'O'
-            if ner == PERSON and len(this_sentence) > 0:
-                pre_tup = this_sentence[-1]
-                pre_word = pre_tup[0]
-                if (pre_word == 'Mrs.' or pre_word == 'Ms.'):
-                    this_sentence[-1] = (pre_word, PERSON)
-
-            this_sentence.append((word, ner))
-
-    return sentence_dict
-
-
 def tupple_to_file(file_name, list_of_tupples):
     with open(file_name, 'w') as f:
         for s in list_of_tupples:
@@ -100,7 +45,7 @@ def tupple_to_file(file_name, list_of_tupples):
 
 
 def stanford_extract_ner_from_sen(sen):
-    r = st.tag(sen)
+    r = get_stanford_tagger().tag(sen)
     return r
 
 
@@ -140,41 +85,29 @@ def replace_ner_with_sentnce(sentene_with_ner, ner_to_replace):
     return string_mask
 
 
-def extract_standford_ner(file):
-    all_stanford_text = {}
-    for i, line in enumerate(open(file)):
-        line = line.split("\t")
-        sen_num = line[0]
-        sen = line[1].split()
-        stanford = stanford_extract_ner_from_sen(sen)
-        all_stanford_text[sen_num] = stanford
-    print ("Done extracting ner from_standord")
-    return all_stanford_text
-
-
-def get_standofrd_ner(stanford_ner_pickle, txt_file):
-    if not (stanford_ner_pickle is None):
-        all_stanford_text = load_from_file(stanford_ner_pickle)
-    else:
-        all_stanford_text = extract_standford_ner(txt_file)
-        save_to_file(all_stanford_text, stanford_ner_pickle)
-    return all_stanford_text
+def get_standofrd_ner(stanford_ner_pickle):
+    # sentences missing here are tagged (and kept in the ner store) by iter_stanford_ner
+    if stanford_ner_pickle is None:
+        return {}
+    if ner_store_enabled() or ner_backend != "stanford":
+        return load_stanford_ner(stanford_ner_pickle)
+    return load_from_file(stanford_ner_pickle)
 
 
 def prepare_data(processed_file,txt_file, stanford_ner_pickle=None,ann = "a"):
     import Bert
-    all_stanford_text = get_standofrd_ner(stanford_ner_pickle, txt_file)
+    all_stanford_text = get_standofrd_ner(stanford_ner_pickle)
     correct_annotations = get_tags_from_annotations(ann)
-    processed_dict = processed_text_to_dict(processed_file)
+    corpus = load_corpus(processed_file)
     data = []
     order_data = []
     with open(txt_file) as f:
-        for i, line in enumerate(f):
+        sentences = [corpus[line.split("\t")[0]] for line in f]
+        for i, (sentence, stanford) in enumerate(iter_stanford_ner(sentences, all_stanford_text)):
             print(i)
-            line = line.split("\t")
-            sen_num = line[0]
-            stanford = all_stanford_text[sen_num]
-            combine_processed_and_stanford = combine_two_sentences(stanford.copy(), processed_dict[sen_num])
+            sen_num = sentence.sen_num
+            combine_processed_and_stanford = combine_two_sentences(stanford.copy(), sentence.ner_tuples(location_tags),
+                                                                   sentence.rows)
             ners = extract_ner(combine_processed_and_stanford)
             person_location_ner = check_person_and_location(ners)
 
@@ -1,119 +1,199 @@
 # Ofer Sabo 201511110 Daniel Ben Itzhak  338017437
 import time
 import sys
+import os
 from utils import *
+from corpus import load_corpus, iter_processed_file
 import pickle
 from codecs import open
-import scipy
+import scipy.sparse
+import ConvertFeatures
+import model_artifact
+import feature_map_store
+import cascade
+import parallel
+import functools
+import asyncio
+import threading
+import pipeline
+import score_sweep
+from concurrent.futures import ThreadPoolExecutor
 
 DEV_STANFORD_NER = "DEV_STANFORD_NER"
 model = None
+cascade_model = None
+prediction_batch_size = 4096  # candidates scored per decision_function call
+streaming_batch_size = 64
+use_compiled_feature_map = True
+pipeline_batch_size = 32  # sentences per NER call in the pipelined mode
+pipeline_queue_size = 8  # batches waiting between two pipeline stages
+pipeline_ner_concurrency = 2  # NER calls in flight
+decision_threshold = 0.0
+use_tuned_threshold = False  # the threshold of score_sweep.py --save, when it was swept for this model
+write_scores = False  # every candidate's score in <output>.scores / .candidates, for score_sweep.py
 
 
 feature_dict = {}
 
 
-def build_matrix(feature_index, num_feature):
-    features_matrix = scipy.sparse.lil_matrix((1, num_feature))
-    for feature_id in feature_index:
-        features_matrix[0, feature_id] = 1
+def predict(matrix, clf):
+    # one decision_function call for a whole batch of candidates
+    scores = clf.decision_function(matrix)
+    labels = clf.classes_[(scores > decision_threshold).astype(int)]
+    return labels, scores
 
-    return features_matrix
 
+def load_model(model_filename):
+    # prefer the numpy artifact, unpickling the sklearn model imports all of sklearn.
+    # an artifact left from an older pickle is ignored
+    if model_artifact.is_current(model_filename):
+        return model_artifact.load_model(model_artifact.artifact_dir_for(model_filename))
+    loaded_model = pickle.load(open(model_filename, 'rb'))
+    return loaded_model
 
-def list_of_index(line, feature_dict, outside):
-    feature_index_per_word = []
-    features = line.strip().split(" ")
-    string_of_line = "0"
 
-    for f in features:
-        if f in feature_dict:
-            feature_index_per_word.append(feature_dict[f])
-        else:
-            outside.append(f)
-    feature_index_per_word = sorted(feature_index_per_word)
-    return string_of_line, feature_index_per_word
+def sentence_candidates(sentence, stanford, outside):
+    context = SentenceContext(sentence)
+    this_sentence_proccesed_data = sentence.rows
+    sen_num = sentence.sen_num
+    combine_processed_and_stanford = combine_two_sentences(stanford.copy(), sentence.ner_tuples(),
+                                                           this_sentence_proccesed_data)
+
+    ners = extract_ner(combine_processed_and_stanford)
+    ner_dict = check_person_and_location(ners)
+
+    candidates = []
+    if not (person in ner_dict and location in ner_dict):
+        return ners, candidates
+
+    possiable_persons, possiable_location = unique_person_and_location(ner_dict[person], ner_dict[location])
+
+    pairs = []
+    for per in possiable_persons:
+        for loc in possiable_location:
+            per_tup, loc_tup = create_nereast_tupple(per, possiable_persons[per], loc, possiable_location[loc])
+            pairs.append((per_tup, loc_tup, per, loc))
+    if cascade_model is not None:
+        keep = cascade_model.keep(cascade.sentence_pairs_features(possiable_persons, possiable_location, pairs, sentence))
+        pairs = [pair for pair, kept in zip(pairs, keep) if kept]
+
+    for per_tup, loc_tup, per, loc in pairs:
+        feature = extract_feature(per_tup, loc_tup, [possiable_persons[per], possiable_location[loc]], context)
+        feature_index, values = ConvertFeatures.feature_row(feature, feature_dict, outside=outside)
+        candidates.append((sen_num, per_tup[0], loc_tup[0], feature_index, values))
+    return ners, candidates
+
+
+def tagged_candidates(tagged, outside=None):
+    # runs in the featurize workers, unknown features are handed back instead of appended to outside
+    sentence, stanford = tagged
+    sentence_outside = [] if outside is not None else None
+    ners, candidates = sentence_candidates(sentence, stanford, sentence_outside)
+    return sentence.sen_num, ners, candidates, sentence_outside
+
+
+def iter_candidates(sentences, all_stanford_text, outside=None, all_sentence_ner_dict=None, workers=1, stats=None):
+    tagged = iter_stanford_ner(prefilter_sentences(sentences), all_stanford_text)
+    if workers > 1:
+        tagged = list(tagged)
+    featurize = functools.partial(tagged_candidates, outside=outside)
+    for sen_num, ners, candidates, sentence_outside in parallel.ordered_map(featurize, tagged, workers, stats):
+        if all_sentence_ner_dict is not None:
+            all_sentence_ner_dict[sen_num] = ners
+        if sentence_outside:
+            outside.extend(sentence_outside)
+        for candidate in candidates:
+            yield candidate
 
 
-def predict(matrix, clf, num_feature):
-    value = clf.predict(matrix)
-    return value
+def score_candidates(candidates):
+    matrix_builder = ConvertFeatures.FeatureMatrixBuilder()
+    for candidate in candidates:
+        matrix_builder.add_row(candidate[3], 0, candidate[4])
+    matrix, _ = matrix_builder.to_csr(len(feature_dict))
+    labels, scores = predict(matrix, model)
+    return list(zip(candidates, labels, scores))
 
 
-def load_model(model_filename):
-    loaded_model = pickle.load(open(model_filename, 'rb'))
-    return loaded_model
+def iter_scored_batches(candidates, batch_size=prediction_batch_size):
+    # (candidate, label, score) lists in input order, batch_size candidates at a time
+    batch = []
+    for candidate in candidates:
+        batch.append(candidate)
+        if len(batch) >= batch_size:
+            yield score_candidates(batch)
+            batch = []
+    if batch:
+        yield score_candidates(batch)
 
 
-def convert_to_vec(txt, outside):
-    tag_str, feature_index = list_of_index(txt, feature_dict, outside)
-    matrix = build_matrix(feature_index, len(feature_dict))
-    res = predict(matrix, model, len(feature_dict))[0]
-    return res
+def candidate_line(candidate):
+    sen_num, per, loc = candidate[:3]
+    return sen_num + "\t" + per + "\tLive_In\t" + loc + "\n"
 
 
-def find_answer(clean_input_file_name, proccessed_input_file_name, output_file_name):
-    if (load_from_pickle):
-        all_stanford_text = load_from_file(DEV_STANFORD_NER)
-    else:
-        all_stanford_text = {}
+def open_score_sidecar(output_file_name):
+    if write_scores:
+        return score_sweep.ScoreWriter(output_file_name)
+    return None
 
-    # correct_annotations = get_tags_from_annotations(golden_file)
-    outside = []
-    save_all_text = []
-    processed_dict = processed_text_to_dict(proccessed_input_file_name)
-    combined_dict = {}
-    word_to_route, all_sentence_data = get_path_from_word(proccessed_input_file_name)
+
+def iter_clean_file_sentences(clean_input_file_name, corpus):
     with open(clean_input_file_name) as f:
-        all_sentence_ner_dict = {}
         for i, line in enumerate(f):
             print(i)
             line = line.split("\t")
-            sen_num = line[0]
-            route_to_root = word_to_route[sen_num]
-            this_sentence_proccesed_data = all_sentence_data[sen_num]
-            if (load_from_pickle):
-                stanford = all_stanford_text[sen_num]
-            else:
-                sen = [k[1] for k in this_sentence_proccesed_data]
-                stanford = stanford_extract_ner_from_sen(sen)
-
-            combine_processed_and_stanford = combine_two_sentences(stanford.copy(), processed_dict[sen_num],
-                                                                   this_sentence_proccesed_data)
-            combined_dict[sen_num] = combine_processed_and_stanford
-
-            ners = extract_ner(combine_processed_and_stanford)
-            ner_dict = check_person_and_location(ners)
-            all_sentence_ner_dict[sen_num] = ners
+            yield corpus[line[0]]
 
-            text = sen_num + "\t"
-            if sen_num == "sent1908":
-                print()
-            # ner_dict = all_sentence_ner_dict[sen_num]
 
-            if not (person in ner_dict and location in ner_dict):
-                continue
+def find_answer(clean_input_file_name, proccessed_input_file_name, output_file_name):
+    all_stanford_text = load_stanford_ner(DEV_STANFORD_NER)
 
-            possiable_persons, possiable_location = unique_person_and_location(ner_dict[person], ner_dict[location])
-
-            for per in possiable_persons:
-                for loc in possiable_location:
-                    per_tup, loc_tup = create_nereast_tupple(per, possiable_persons[per], loc, possiable_location[loc])
-                    feature = extract_feature(per_tup, loc_tup, route_to_root,
-                                              [possiable_persons[per], possiable_location[loc]],
-                                              this_sentence_proccesed_data)
-                    # true_or_not = tupple_in_annotion(per_tup, loc_tup, correct_annotations[sen_num])
-                    txt = convert_to_text_only_feature(feature)
-                    pred = convert_to_vec(txt, outside)
-                    if pred:  # or len(possiable_persons)*len(possiable_location)==1:
-                        text_line = text + per_tup[0] + "\tLive_In\t" + loc_tup[0] + "\n"
-                        save_all_text.append(text_line)
+    # correct_annotations = get_tags_from_annotations(golden_file)
+    outside = []
+    save_all_text = []
+    all_sentence_ner_dict = {}
+    corpus = load_corpus(proccessed_input_file_name, use_corpus_cache)
+    sentences = iter_clean_file_sentences(clean_input_file_name, corpus)
+    stats = {}
+    sidecar = open_score_sidecar(output_file_name)
+    candidates = iter_candidates(sentences, all_stanford_text, outside, all_sentence_ner_dict, featurize_workers, stats)
+    for batch in iter_scored_batches(candidates):
+        for candidate, pred, score in batch:
+            if pred:
+                save_all_text.append(candidate_line(candidate))
+        if sidecar is not None:
+            sidecar.add(batch)
 
     write_to_file(output_file_name, save_all_text)
+    if sidecar is not None:
+        sidecar.close()
+    if featurize_workers > 1:
+        parallel.print_stats(stats)
     # save_to_file(all_stanford_text,DEV_STANFORD_NER )
     return all_sentence_ner_dict
 
 
+def find_answer_streaming(proccessed_input_file_name, output_file_name):
+    # one sentence at a time straight from the processed file, results are
+    # flushed after every small batch so memory does not grow with the corpus
+    all_stanford_text = load_stanford_ner(DEV_STANFORD_NER)
+
+    candidates = iter_candidates(iter_processed_file(proccessed_input_file_name), all_stanford_text)
+    sidecar = open_score_sidecar(output_file_name)
+    with open(output_file_name, 'w') as out:
+        for batch in iter_scored_batches(candidates, streaming_batch_size):
+            lines = [candidate_line(candidate) for candidate, pred, score in batch if pred]
+            if lines:
+                out.write(''.join(lines))
+                out.flush()
+            if sidecar is not None:
+                sidecar.add(batch)
+    if sidecar is not None:
+        sidecar.close()
+    return {}
+
+
 def analyze_feature_map(input_file):
     f = open(input_file, "r")
     for i, line in enumerate(f):
@@ -123,15 +203,142 @@ def analyze_feature_map(input_file):
         feature_dict[tag] = int(index)
 
 
+def find_answer_pipelined(clean_input_file_name, proccessed_input_file_name, output_file_name):
+    return asyncio.run(run_pipeline(clean_input_file_name, proccessed_input_file_name, output_file_name))
+
+
+async def run_pipeline(clean_input_file_name, proccessed_input_file_name, output_file_name):
+    # reader -> NER -> featurizer -> scorer/writer over bounded queues, so the NER wait for
+    # one batch overlaps featurizing and scoring the batch before. batches are put back in
+    # order before featurizing, the output is the same as find_answer.
+    all_stanford_text = load_stanford_ner(DEV_STANFORD_NER)
+    corpus = load_corpus(proccessed_input_file_name, use_corpus_cache)
+    all_sentence_ner_dict = {}
+    # the dynet graph of the lstm tagger is global, one call at a time
+    concurrency = 1 if ner_backend == "lstm" else pipeline_ner_concurrency
+    sentences_queue = pipeline.MeteredQueue("sentences", pipeline_queue_size)
+    tagged_queue = pipeline.MeteredQueue("tagged", pipeline_queue_size)
+    candidates_queue = pipeline.MeteredQueue("candidates", pipeline_queue_size)
+    # batches between the reader and the featurizer, bounds the reorder buffer too
+    in_flight = asyncio.Semaphore(2 * pipeline_queue_size + concurrency)
+    times = pipeline.StageTimes()
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(concurrency)
+    # the ner store is not thread safe, lookups and additions take turns
+    store_lock = threading.Lock()
+
+    def tag_batch(batch):
+        # runs in the executor, store reads, gazetteer scans and store appends (which may wait
+        # on other processes' file locks) stay off the event loop like the tagger call
+        with store_lock:
+            tagged = lookup_stanford_ner(batch, all_stanford_text)
+        missing = [i for i, tags in enumerate(tagged) if tags is None]
+        if missing:
+            new_tags = stanford_extract_ner_from_sents([batch[i].words for i in missing])
+            with store_lock:
+                fill_stanford_ner(batch, tagged, missing, new_tags)
+        return tagged
+
+    async def reader():
+        sentences = prefilter_sentences(iter_clean_file_sentences(clean_input_file_name, corpus))
+        for seq, batch in enumerate(iter_batches(sentences, pipeline_batch_size)):
+            await in_flight.acquire()
+            await sentences_queue.put((seq, batch))
+        for _ in range(concurrency):
+            await sentences_queue.put(None)
+
+    async def tagger():
+        while True:
+            item = await sentences_queue.get()
+            if item is None:
+                await tagged_queue.put(None)
+                return
+            seq, batch = item
+            began = time.time()
+            tagged = await loop.run_in_executor(executor, tag_batch, batch)
+            times.add("ner", began)
+            await tagged_queue.put((seq, list(zip(batch, tagged))))
+
+    async def featurizer():
+        pending = {}
+        next_seq = 0
+        finished = 0
+        while finished < concurrency:
+            item = await tagged_queue.get()
+            if item is None:
+                finished += 1
+                continue
+            pending[item[0]] = item[1]
+            while next_seq in pending:
+                began = time.time()
+                candidates = []
+                for sentence, stanford in pending.pop(next_seq):
+                    ners, sentence_candidates_list = sentence_candidates(sentence, stanford, None)
+                    all_sentence_ner_dict[sentence.sen_num] = ners
+                    candidates.extend(sentence_candidates_list)
+                times.add("featurize", began)
+                next_seq += 1
+                in_flight.release()
+                await candidates_queue.put(candidates)
+        await candidates_queue.put(None)
+
+    async def scorer():
+        sidecar = open_score_sidecar(output_file_name)
+        with open(output_file_name, 'w') as out:
+            while True:
+                candidates = await candidates_queue.get()
+                if candidates is None:
+                    break
+                if candidates:
+                    began = time.time()
+                    batch = score_candidates(candidates)
+                    lines = [candidate_line(candidate) for candidate, pred, score in batch if pred]
+                    out.write(''.join(lines))
+                    out.flush()
+                    if sidecar is not None:
+                        sidecar.add(batch)
+                    times.add("score", began)
+        if sidecar is not None:
+            sidecar.close()
+
+    try:
+        await asyncio.gather(reader(), featurizer(), scorer(), *[tagger() for _ in range(concurrency)])
+    finally:
+        executor.shutdown()
+    pipeline.print_report([sentences_queue, tagged_queue, candidates_queue], times)
+    return all_sentence_ner_dict
+
+
 def main(clean_input_file_name="data/Corpus.DEV.txt", input_file_name="data/Corpus.DEV.processed",
          model_filename="saved_model_short",
-         feature_map_filename="feature_map_file.txt", output_file_name="SVM_OUTPUT.txt"):
+         feature_map_filename="feature_map_file.txt", output_file_name="SVM_OUTPUT.txt", stream=False,
+         hash_buckets=None, pipelined=False):
     # input_file_name q_mle_filename e_mle_filename output_file_name extra_file_name
-    global model
+    global model, feature_dict, cascade_model, decision_threshold
     model = load_model(model_filename)
-    analyze_feature_map(feature_map_filename)
-    all_sentence_ner_dict = find_answer(clean_input_file_name, input_file_name,
-                                        output_file_name)  # ../files/MEMM_output.txt
+    if use_tuned_threshold:
+        threshold = score_sweep.load_threshold(model_filename)
+        decision_threshold = threshold if threshold is not None else 0.0
+    if use_cascade and os.path.exists(cascade.cascade_model_file):
+        cascade_model = cascade.load_cascade(cascade.cascade_model_file)
+    if isinstance(model, model_artifact.LinearModel):
+        hash_buckets = model.meta.get("hash_buckets")
+        feature_map_filename = model_artifact.feature_map_path(model_artifact.artifact_dir_for(model_filename))
+    elif hash_buckets is None:
+        hash_buckets = ConvertFeatures.hash_buckets
+    if hash_buckets:
+        feature_dict = ConvertFeatures.HashingFeatureMap(hash_buckets)
+    elif use_compiled_feature_map:
+        feature_dict = feature_map_store.load_feature_map(feature_map_filename)
+    else:
+        analyze_feature_map(feature_map_filename)
+    if stream:
+        all_sentence_ner_dict = find_answer_streaming(input_file_name, output_file_name)
+    elif pipelined:
+        all_sentence_ner_dict = find_answer_pipelined(clean_input_file_name, input_file_name, output_file_name)
+    else:
+        all_sentence_ner_dict = find_answer(clean_input_file_name, input_file_name,
+                                            output_file_name)  # ../files/MEMM_output.txt
     return output_file_name, all_sentence_ner_dict
 
 
@@ -139,15 +346,20 @@ if __name__ == '__main__':
     import evaluate_result
 
     start = time.time()
-    clean_input_file_name = sys.argv[1] if len(sys.argv) > 1 else "data/Corpus.DEV.txt"
-    input_processed_file_name = sys.argv[2] if len(sys.argv) > 2 else "data/Corpus.DEV.processed"
-    gold_annotation = sys.argv[3] if len(sys.argv) > 3 else "data/DEV.annotations"
+    stream = "--stream" in sys.argv
+    pipelined = "--pipeline" in sys.argv
+    write_scores = write_scores or "--scores" in sys.argv
+    use_tuned_threshold = use_tuned_threshold or "--tuned-threshold" in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg not in ("--stream", "--pipeline", "--scores", "--tuned-threshold")]
+    clean_input_file_name = args[0] if len(args) > 0 else "data/Corpus.DEV.txt"
+    input_processed_file_name = args[1] if len(args) > 1 else "data/Corpus.DEV.processed"
+    gold_annotation = args[2] if len(args) > 2 else "data/DEV.annotations"
     model_filename = "saved_model_short"
     feature_map_filename = "feature_map_file.txt"
     output_file_name = "SVM_OUTPUT.txt"
 
     all_sentence_ner_dict = main(clean_input_file_name, input_processed_file_name, model_filename, feature_map_filename,
-                                 output_file_name)
+                                 output_file_name, stream, pipelined=pipelined)
     missd_rel = evaluate_result.main(output_file_name, gold_annotation)
     if (DEBUG_RESULT):
         missed_locs = 0
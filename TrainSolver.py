@@ -7,7 +7,13 @@ from sklearn.linear_model import LogisticRegression
 from sklearn.svm import LinearSVC
 from sklearn.svm import SVC
 import pickle
+import model_artifact
+import ConvertFeatures
+import sampling
+import os
 
+svm_params = {"penalty": 'l2', "C": .5}  # what tune.py found best can go here
+aggregate_duplicates = True  # fit on the distinct rows with their counts as sample_weight
 
 # def only_check(model_file,X):
 #     model = load_model(model_file)
@@ -31,13 +37,42 @@ def plot_coefficients(classifier, feature_names = 0, top_features=20):
 
 
 
-def main(feature_vec="vec_file.txt", model_file="saved_model_short"):
-    X_train, y_train = load_svmlight_file(feature_vec)
+def main(feature_vec="vec_file.txt", model_file="saved_model_short", feature_map_file="feature_map_file.txt",
+         hash_buckets=None):
+    if hash_buckets:
+        X_train, y_train = load_svmlight_file(feature_vec, n_features=hash_buckets)
+        feature_map_file = None
+    else:
+        X_train, y_train = load_svmlight_file(feature_vec)
     print("loaded")
     # only_check(model_file,X_train)
-    clf = LinearSVC(penalty='l2', verbose=False, C=.5)
-    model = clf.fit(X_train, y_train)
+    return train(X_train, y_train, model_file, feature_map_file, hash_buckets)
+
+
+def train(X_train, y_train, model_file="saved_model_short", feature_map_file="feature_map_file.txt",
+          hash_buckets=None):
+    clf = LinearSVC(verbose=False, **svm_params)
+    sample_weight = None
+    if sampling.negative_rate < 1.0:
+        scores = None
+        if sampling.hard_negative_share > 0 and sampling.hard_negative_model is not None \
+                and os.path.exists(sampling.hard_negative_model):
+            scores = sampling.previous_model_scores(X_train, sampling.hard_negative_model)
+        keep, sample_weight = sampling.sample_negatives(y_train, scores=scores)
+        sampling.report(y_train, keep)
+        X_train, y_train = X_train[keep], y_train[keep]
+    if aggregate_duplicates:
+        rows = X_train.shape[0]
+        X_train, y_train, sample_weight = ConvertFeatures.aggregate_rows(X_train, y_train, sample_weight)
+        print("training rows %d -> %d distinct, compression %.2fx" % (rows, X_train.shape[0],
+                                                                      float(rows) / max(X_train.shape[0], 1)))
+    if sample_weight is not None:
+        model = clf.fit(X_train, y_train, sample_weight=sample_weight)
+    else:
+        model = clf.fit(X_train, y_train)
     pickle.dump(clf, open(model_file, 'wb'))
+    if feature_map_file is not None or hash_buckets:
+        model_artifact.export_model(clf, model_file, feature_map_file, hash_buckets)
     # plot_coefficients(model)
     # exit()
     return model_file
@@ -0,0 +1,156 @@
+import sys
+import json
+import numpy as np
+
+# first stage of candidate scoring. a small logistic model over features that only
+# need the tokens and the entity positions (no dependency routes, no feature map)
+# drops the (person, location) pairs that are clearly not Live_In, the threshold is
+# set on the training pairs so that recall_target of the true pairs get through.
+# only the pairs kept go through extract_feature and the SVM.
+CASCADE_VERSION = 1
+cascade_model_file = "cascade_model.json"
+cascade_pairs_file = "cascade_pairs.npz"  # the training pairs, kept to move the recall target without svm_approach
+recall_target = 0.98
+epochs = 200
+learning_rate = 0.5
+l2 = 1e-3
+clause_breaks = set([',', ':', 'CC', 'WDT', 'WP', 'WRB', '-LRB-', '-RRB-'])
+location_prepositions = set(['in', 'from', 'of', 'at', 'near'])
+feature_names = ["log_distance", "min_log_distance", "person_first", "clause_breaks", "verbs_between",
+                 "entities_between", "location_preposition", "closest_location", "closest_person",
+                 "log_persons", "log_locations", "log_length"]
+
+
+def entity_span(tup):
+    # entities are (words, index of their last token)
+    end = int(tup[1])
+    return end - len(tup[0].split()) + 1, end
+
+
+def cheap_features(per_tup, loc_tup, person_indices, location_indices, all_person_indices, all_location_indices,
+                   sentence):
+    per_start, per_end = entity_span(per_tup)
+    loc_start, loc_end = entity_span(loc_tup)
+    if per_end < loc_start:
+        between = range(per_end + 1, loc_start)
+    else:
+        between = range(loc_end + 1, per_start)
+    pos = sentence.pos
+    closest_location = min(all_location_indices, key=lambda i: abs(i - per_end))
+    closest_person = min(all_person_indices, key=lambda i: abs(i - loc_end))
+    entity_ends = set(all_person_indices) | set(all_location_indices)
+    return [
+        np.log1p(len(between)),
+        np.log1p(min(abs(p - l) for p in person_indices for l in location_indices)),
+        float(per_end < loc_start),
+        sum(1 for i in between if pos[i] in clause_breaks),
+        sum(1 for i in between if pos[i].startswith('VB')),
+        sum(1 for i in between if i in entity_ends),
+        float(loc_start > 0 and sentence.words[loc_start - 1].lower() in location_prepositions),
+        float(closest_location in location_indices),
+        float(closest_person in person_indices),
+        np.log1p(len(all_person_indices)),
+        np.log1p(len(all_location_indices)),
+        np.log1p(len(sentence)),
+    ]
+
+
+def sentence_pairs_features(possiable_persons, possiable_location, pairs, sentence):
+    # one row per (per_tup, loc_tup, per, loc) pair of a sentence
+    all_persons = [i for indices in possiable_persons.values() for i in indices]
+    all_locations = [i for indices in possiable_location.values() for i in indices]
+    return np.array([cheap_features(per_tup, loc_tup, possiable_persons[per], possiable_location[loc],
+                                    all_persons, all_locations, sentence)
+                     for per_tup, loc_tup, per, loc in pairs], dtype=np.float64).reshape(len(pairs), len(feature_names))
+
+
+class CascadeModel(object):
+    def __init__(self, weights, bias, mean, scale, threshold):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.threshold = float(threshold)
+
+    def scores(self, X):
+        z = (np.asarray(X, dtype=np.float64) - self.mean) / self.scale
+        return 1.0 / (1.0 + np.exp(-(z.dot(self.weights) + self.bias)))
+
+    def keep(self, X):
+        if len(X) == 0:
+            return np.zeros(0, dtype=bool)
+        return self.scores(X) >= self.threshold
+
+    def save(self, file_name=cascade_model_file):
+        with open(file_name, 'w') as f:
+            json.dump({"version": CASCADE_VERSION, "features": feature_names, "weights": self.weights.tolist(),
+                       "bias": self.bias, "mean": self.mean.tolist(), "scale": self.scale.tolist(),
+                       "threshold": self.threshold}, f)
+
+
+def load_cascade(file_name=cascade_model_file):
+    with open(file_name) as f:
+        meta = json.load(f)
+    if meta["version"] != CASCADE_VERSION or meta["features"] != feature_names:
+        raise IOError("cascade model %s was trained on other features" % file_name)
+    return CascadeModel(meta["weights"], meta["bias"], meta["mean"], meta["scale"], meta["threshold"])
+
+
+def recall_threshold(scores, y, target):
+    # highest threshold that still keeps target of the positive pairs
+    positive = np.sort(scores[y == 1])
+    if len(positive) == 0:
+        return 0.0
+    drop = int(np.floor(len(positive) * (1 - target)))
+    return float(positive[drop])
+
+
+def train_cascade(X, y, target=recall_target, file_name=cascade_model_file):
+    # logistic regression by full batch gradient descent, positives weighted up to balance the classes
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    mean = X.mean(axis=0)
+    scale = X.std(axis=0)
+    scale[scale == 0] = 1.0
+    z = (X - mean) / scale
+    positives = max(y.sum(), 1.0)
+    sample_weight = np.where(y == 1, (len(y) - positives) / positives, 1.0)
+    sample_weight /= sample_weight.sum()
+    weights = np.zeros(X.shape[1])
+    bias = 0.0
+    for _ in range(epochs):
+        p = 1.0 / (1.0 + np.exp(-(z.dot(weights) + bias)))
+        error = (p - y) * sample_weight
+        weights -= learning_rate * (z.T.dot(error) + l2 * weights)
+        bias -= learning_rate * error.sum()
+    model = CascadeModel(weights, bias, mean, scale, 0.0)
+    scores = model.scores(X)
+    model.threshold = recall_threshold(scores, y, target)
+    kept = scores >= model.threshold
+    print("cascade keeps %d / %d pairs, recall %.4f on the training pairs"
+          % (kept.sum(), len(y), kept[y == 1].mean() if y.sum() else 1.0))
+    if file_name is not None:
+        model.save(file_name)
+    return model
+
+
+def train_on_sentences(blocks, labels, target=recall_target):
+    # blocks: the sentence_pairs_features of every training sentence, labels in the same order
+    X = np.vstack(blocks) if blocks else np.zeros((0, len(feature_names)))
+    save_pairs(X, labels)
+    return train_cascade(X, labels, target)
+
+
+def save_pairs(X, y, file_name=cascade_pairs_file):
+    np.savez(file_name, X=np.asarray(X, dtype=np.float64), y=np.asarray(y, dtype=np.int8))
+
+
+def load_pairs(file_name=cascade_pairs_file):
+    pairs = np.load(file_name)
+    return pairs["X"], pairs["y"]
+
+
+if __name__ == '__main__':
+    # python cascade.py 0.95    retrain on the saved training pairs with another recall target
+    X, y = load_pairs()
+    train_cascade(X, y, float(sys.argv[1]) if len(sys.argv) > 1 else recall_target)
@@ -0,0 +1,83 @@
+PERSON = 'PERSON'
+LOCATION = 'LOCATION'
+Mr_Mrs = set(['Mrs.', 'Ms.'])
+
+
+class Sentence(object):
+    # one sentence of a .processed file, each row is the split token line:
+    # index word lemma POS coarse_POS head dependency ... NER
+    def __init__(self, sen_num, rows):
+        self.sen_num = sen_num
+        self.rows = rows
+        self.words = [r[1] for r in rows]
+        self.lemmas = [r[2] for r in rows]
+        self.pos = [r[3] for r in rows]
+        self.coarse_pos = [r[4] for r in rows]
+        self.heads = [int(r[5]) for r in rows]
+        self.deps = [r[6] for r in rows]
+        self.ner = [r[-1] for r in rows]
+
+    @classmethod
+    def from_columns(cls, sen_num, words, lemmas, pos, coarse_pos, heads, deps, ner):
+        sentence = cls.__new__(cls)
+        sentence.sen_num = sen_num
+        sentence.rows = [[str(i), w, l, p, c, str(h), d, n] for i, (w, l, p, c, h, d, n) in
+                         enumerate(zip(words, lemmas, pos, coarse_pos, heads, deps, ner), 1)]
+        sentence.words = words
+        sentence.lemmas = lemmas
+        sentence.pos = pos
+        sentence.coarse_pos = coarse_pos
+        sentence.heads = heads
+        sentence.deps = deps
+        sentence.ner = ner
+        return sentence
+
+    def __len__(self):
+        return len(self.rows)
+
+    def ner_tuples(self, location_tags=("GPE",)):
+        # (word, ner) list in the same shape as the stanford tagger output
+        this_sentence = []
+        for word, pos, ner in zip(self.words, self.pos, self.ner):
+            if ner in location_tags:
+                ner = LOCATION
+            if pos == 'POS':
+                ner = 'O'
+            if ner == PERSON and len(this_sentence) > 0 and this_sentence[-1][0] in Mr_Mrs:
+                this_sentence[-1] = (this_sentence[-1][0], PERSON)
+            this_sentence.append((word, ner))
+        return this_sentence
+
+
+def iter_processed_file(file_name):
+    last_line_is_blank = True
+    rows = None
+    with open(file_name) as f:
+        for line in f:
+            line = line.strip().replace("\t", " ").split()
+            if last_line_is_blank:
+                last_line_is_blank = False
+                sen_num = line[-1]
+                rows = []
+                continue
+            elif len(line) == 0:
+                last_line_is_blank = True
+                yield Sentence(sen_num, rows)
+                continue
+            elif line[0].isdigit():
+                rows.append(line)
+    if not last_line_is_blank:
+        yield Sentence(sen_num, rows)
+
+
+def load_corpus(file_name, use_cache=False):
+    if use_cache:
+        import corpus_cache
+        try:
+            return corpus_cache.load_compiled_corpus(file_name)
+        except OSError as e:
+            print("could not use corpus cache for %s: %s" % (file_name, e))
+    corpus = {}
+    for sentence in iter_processed_file(file_name):
+        corpus[sentence.sen_num] = sentence
+    return corpus
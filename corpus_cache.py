@@ -0,0 +1,180 @@
+import os
+import sys
+import json
+import hashlib
+import fcntl
+import contextlib
+from array import array
+import numpy as np
+from corpus import Sentence, iter_processed_file
+
+CACHE_VERSION = 1
+string_columns = ["words", "lemmas", "pos", "coarse_pos", "deps", "ner"]
+
+
+def cache_dir_for(processed_file):
+    return processed_file + ".cache"
+
+
+def file_hash(file_name, block_size=1 << 20):
+    h = hashlib.sha1()
+    with open(file_name, 'rb') as f:
+        block = f.read(block_size)
+        while block:
+            h.update(block)
+            block = f.read(block_size)
+    return h.hexdigest()
+
+
+def replace_file(path, write):
+    # written under a temporary name and renamed over path, a process that has the old
+    # file memory mapped keeps reading the old file instead of a truncated one
+    tmp = "%s.tmp.%d" % (path, os.getpid())
+    with open(tmp, 'wb') as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def write_json(path, obj):
+    replace_file(path, lambda f: f.write(json.dumps(obj).encode("utf-8")))
+
+
+@contextlib.contextmanager
+def directory_lock(directory, exclusive):
+    # exclusive while a directory is (re)written, shared while its files are opened,
+    # so a reader always opens the files of one compile
+    fd = os.open(os.path.join(directory, "lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        os.close(fd)
+
+
+def compile_corpus(processed_file, cache_dir=None):
+    if cache_dir is None:
+        cache_dir = cache_dir_for(processed_file)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+    with directory_lock(cache_dir, True):
+        return write_cache(processed_file, cache_dir)
+
+
+def write_cache(processed_file, cache_dir):
+    # callers hold the exclusive directory lock
+    stat = os.stat(processed_file)
+    vocab = dict((col, {}) for col in string_columns)
+    ids = dict((col, array('i')) for col in string_columns)
+    heads = array('i')
+    offsets = array('q', [0])
+    sen_nums = []
+    for sentence in iter_processed_file(processed_file):
+        for col in string_columns:
+            col_vocab = vocab[col]
+            col_ids = ids[col]
+            for value in getattr(sentence, col):
+                col_ids.append(col_vocab.setdefault(value, len(col_vocab)))
+        heads.extend(sentence.heads)
+        offsets.append(len(heads))
+        sen_nums.append(sentence.sen_num)
+
+    columns = [(col, np.frombuffer(ids[col], dtype=np.int32)) for col in string_columns]
+    columns += [("heads", np.frombuffer(heads, dtype=np.int32)), ("offsets", np.frombuffer(offsets, dtype=np.int64))]
+    for col, values in columns:
+        replace_file(os.path.join(cache_dir, col + ".npy"), lambda f: np.save(f, values))
+    write_json(os.path.join(cache_dir, "vocab.json"),
+               dict((col, sorted(vocab[col], key=vocab[col].get)) for col in string_columns))
+
+    # meta is written last, a cache without it is never considered valid
+    meta = {"version": CACHE_VERSION, "source": os.path.abspath(processed_file),
+            "source_hash": file_hash(processed_file), "source_size": stat.st_size,
+            "source_mtime": stat.st_mtime, "sen_nums": sen_nums}
+    write_json(os.path.join(cache_dir, "meta.json"), meta)
+    return cache_dir
+
+
+def read_meta(cache_dir):
+    meta_file = os.path.join(cache_dir, "meta.json")
+    if not os.path.exists(meta_file):
+        return None
+    with open(meta_file) as f:
+        return json.load(f)
+
+
+def cache_is_valid(processed_file, meta):
+    if meta is None or meta.get("version") != CACHE_VERSION:
+        return False
+    stat = os.stat(processed_file)
+    if stat.st_size != meta["source_size"]:
+        return False
+    if stat.st_mtime == meta["source_mtime"]:
+        return True
+    return file_hash(processed_file) == meta["source_hash"]
+
+
+class CompiledCorpus(object):
+    # read only, dict like view over a compiled cache directory, the token
+    # columns stay memory mapped and a Sentence is only built on access
+    def __init__(self, cache_dir, meta):
+        self.cache_dir = cache_dir
+        self.sen_nums = meta["sen_nums"]
+        self.position = dict((sen_num, i) for i, sen_num in enumerate(self.sen_nums))
+        with open(os.path.join(cache_dir, "vocab.json")) as f:
+            self.vocab = json.load(f)
+        self.columns = {}
+        for col in string_columns + ["heads", "offsets"]:
+            self.columns[col] = np.load(os.path.join(cache_dir, col + ".npy"), mmap_mode='r')
+
+    def __len__(self):
+        return len(self.sen_nums)
+
+    def __iter__(self):
+        return iter(self.sen_nums)
+
+    def __contains__(self, sen_num):
+        return sen_num in self.position
+
+    def keys(self):
+        return list(self.sen_nums)
+
+    def sentence_at(self, i):
+        offsets = self.columns["offsets"]
+        start, end = int(offsets[i]), int(offsets[i + 1])
+        values = []
+        for col in string_columns:
+            col_vocab = self.vocab[col]
+            values.append([col_vocab[k] for k in self.columns[col][start:end].tolist()])
+        words, lemmas, pos, coarse_pos, deps, ner = values
+        heads = self.columns["heads"][start:end].tolist()
+        return Sentence.from_columns(self.sen_nums[i], words, lemmas, pos, coarse_pos, heads, deps, ner)
+
+    def __getitem__(self, sen_num):
+        return self.sentence_at(self.position[sen_num])
+
+    def iter_sentences(self):
+        for i in range(len(self.sen_nums)):
+            yield self.sentence_at(i)
+
+
+def load_compiled_corpus(processed_file, cache_dir=None):
+    if cache_dir is None:
+        cache_dir = cache_dir_for(processed_file)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+    with directory_lock(cache_dir, False):
+        meta = read_meta(cache_dir)
+        if cache_is_valid(processed_file, meta):
+            return CompiledCorpus(cache_dir, meta)
+    with directory_lock(cache_dir, True):
+        # another process may have compiled it while we waited
+        meta = read_meta(cache_dir)
+        if not cache_is_valid(processed_file, meta):
+            print("compiling corpus cache for " + processed_file)
+            write_cache(processed_file, cache_dir)
+            meta = read_meta(cache_dir)
+        return CompiledCorpus(cache_dir, meta)
+
+
+if __name__ == '__main__':
+    for processed_file in sys.argv[1:]:
+        compile_corpus(processed_file)
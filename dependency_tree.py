@@ -0,0 +1,114 @@
+class DependencyTree(object):
+    # dependency tree of one sentence kept as a parent array, with an euler tour
+    # and a sparse table over it so the lowest common ancestor of any two tokens
+    # is found in constant time. tokens are 0 based, a ROOT token has parent -1,
+    # all ROOT tokens hang from one virtual node (index n) so a sentence holding
+    # several parses is still a single tree.
+    def __init__(self, heads, deps, pos, ner):
+        n = len(heads)
+        self.n = n
+        self.deps = deps
+        self.pos = pos
+        self.ner = ner
+        self.parent = [heads[i] - 1 if deps[i] != 'ROOT' else -1 for i in range(n)]
+        children = [[] for _ in range(n + 1)]
+        for i, p in enumerate(self.parent):
+            children[p if p >= 0 else n].append(i)
+
+        self.depth = [0] * (n + 1)
+        self.depth[n] = -1
+        self.first = [0] * (n + 1)
+        self.preorder = []
+        euler = []
+        stack = [(n, 0)]
+        while stack:
+            node, k = stack.pop()
+            if k == 0:
+                self.first[node] = len(euler)
+                self.preorder.append(node)
+            euler.append(node)
+            if k < len(children[node]):
+                stack.append((node, k + 1))
+                child = children[node][k]
+                self.depth[child] = self.depth[node] + 1
+                stack.append((child, 0))
+
+        depth = self.depth
+        table = [euler]
+        j = 1
+        while (1 << j) <= len(euler):
+            prev = table[-1]
+            half = 1 << (j - 1)
+            row = []
+            for i in range(len(euler) - (1 << j) + 1):
+                a, b = prev[i], prev[i + half]
+                row.append(a if depth[a] <= depth[b] else b)
+            table.append(row)
+            j += 1
+        self.table = table
+        self.tag_counts = {}
+
+    @classmethod
+    def from_sentence(cls, sentence):
+        return cls(sentence.heads, sentence.deps, sentence.pos, sentence.ner)
+
+    def lca(self, u, v):
+        # -1 when the two tokens only meet at the virtual node
+        l, r = self.first[u], self.first[v]
+        if l > r:
+            l, r = r, l
+        j = (r - l + 1).bit_length() - 1
+        a, b = self.table[j][l], self.table[j][r - (1 << j) + 1]
+        node = a if self.depth[a] <= self.depth[b] else b
+        return -1 if node == self.n else node
+
+    def distance(self, u, v):
+        l = self.lca(u, v)
+        if l == -1:
+            return None
+        return self.depth[u] + self.depth[v] - 2 * self.depth[l]
+
+    def climb(self, u, ancestor):
+        # tokens from u up to ancestor, ancestor itself excluded
+        nodes = []
+        while u != ancestor:
+            nodes.append(u)
+            u = self.parent[u]
+        return nodes
+
+    def path_labels(self, u, v):
+        l = self.lca(u, v)
+        return [self.deps[x] for x in self.climb(u, l)], [self.deps[x] for x in self.climb(v, l)]
+
+    def path_pos(self, u, v):
+        l = self.lca(u, v)
+        return [self.pos[x] for x in self.climb(u, l)], [self.pos[x] for x in self.climb(v, l)]
+
+    def count_tag_to_root(self, tag):
+        # counts[u] = number of tokens tagged tag from u up to its ROOT token
+        if tag not in self.tag_counts:
+            counts = [0] * (self.n + 1)
+            for node in self.preorder:
+                if node == self.n:
+                    continue
+                p = self.parent[node]
+                counts[node] = (counts[p] if p >= 0 else 0) + (self.ner[node] == tag)
+            self.tag_counts[tag] = counts
+        return self.tag_counts[tag]
+
+    def count_between(self, u, ancestor, tag):
+        # tokens tagged tag strictly between u and its ancestor
+        if u == ancestor:
+            return 0
+        counts = self.count_tag_to_root(tag)
+        return counts[self.parent[u]] - counts[ancestor]
+
+    def entity_on_path(self, u, v, tag, include_lca=True):
+        # is there a token tagged tag on the path between u and v (ends excluded)
+        l = self.lca(u, v)
+        if l == -1:
+            return False
+        found = self.count_between(u, l, tag) + self.count_between(v, l, tag)
+        if include_lca and l != u and l != v:
+            found += self.ner[l] == tag
+        return found > 0
@@ -69,6 +69,24 @@ def read_pred(pred_file_name, sentnce_to_relation):
     return good, bad, pred_set
 
 
+def prec_recall_f1(good, bad, gold_items, pred_set):
+    if good + bad > 0:
+        prec = good / (good + bad)
+    else:
+        prec = 0
+    recall = 1 - len(gold_items - pred_set) / len(gold_items) if gold_items else 0
+    f1 = 2 * prec * recall / (prec + recall) if prec + recall > 0 else 0
+    return prec, recall, f1
+
+
+def score_items(pred_items, sentnce_to_relation, gold_items):
+    # the scoring of read_pred and main for (sen_num, per, loc) predictions held in memory, without the prints
+    pred_set = set((sen_num, remove_dot(per), remove_dot(loc)) for sen_num, per, loc in pred_items)
+    good = float(sum(1 for sen_num, per, loc in pred_set if (per, loc) in sentnce_to_relation.get(sen_num, ())))
+    bad = len(pred_set) - good
+    return prec_recall_f1(good, bad, gold_items, pred_set)
+
+
 def main(pred_file_name="save_output.txt", golden_file_name="data/DEV.annotations"):
     # gold_file_name = "data/TRAIN.annotations"
     sentnce_to_relation, gold_items = gold_file(golden_file_name)
@@ -85,17 +103,13 @@ def main(pred_file_name="save_output.txt", golden_file_name="data/DEV.annotation
     print("good =", good)
     print("bad  =", bad)
 
-    if good + bad > 0:
-        prec = good / (good + bad)
-    else:
-        prec = 0
-    recall = 1 - len(gold_items - pred_set) / len(gold_items)
+    prec, recall, f1 = prec_recall_f1(good, bad, gold_items, pred_set)
 
     print("len of all Live in ", len(gold_items))
 
     print("prec " + str(prec))
     print("recall " + str(recall))
-    print("F1 score ", 2 * prec * recall / (prec + recall))
+    print("F1 score ", f1)
     return (gold_items - pred_set)
 
 
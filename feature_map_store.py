@@ -0,0 +1,153 @@
+import os
+import sys
+import json
+import hashlib
+import numpy as np
+from corpus_cache import file_hash, replace_file, write_json, directory_lock
+
+STORE_VERSION = 1
+
+
+def store_dir_for(feature_map_file):
+    return feature_map_file + ".bin"
+
+
+def feature_hash(name):
+    return int.from_bytes(hashlib.blake2b(name.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def read_text_feature_map(feature_map_file):
+    feature_map = {}
+    with open(feature_map_file) as f:
+        for line in f:
+            parts = line.strip().split(" ")
+            feature_map[parts[0]] = int(parts[1])
+    return feature_map
+
+
+def compile_feature_map(feature_map_file, store_dir=None):
+    # sorted 64 bit hashes of the feature names next to their ids, plus the names
+    # themselves (one utf-8 blob and offsets) to confirm a hash hit
+    if store_dir is None:
+        store_dir = store_dir_for(feature_map_file)
+    if not os.path.isdir(store_dir):
+        os.makedirs(store_dir, exist_ok=True)
+    with directory_lock(store_dir, True):
+        return write_store(feature_map_file, store_dir)
+
+
+def write_store(feature_map_file, store_dir):
+    # callers hold the exclusive directory lock, files are replaced so a running Predict
+    # keeps the arrays it has mapped
+    stat = os.stat(feature_map_file)
+    feature_map = read_text_feature_map(feature_map_file)
+    names = list(feature_map)
+    hashes = np.array([feature_hash(name) for name in names], dtype=np.uint64)
+    order = np.argsort(hashes, kind="stable")
+    encoded = [names[i].encode("utf-8") for i in order]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    arrays = [("hashes", hashes[order]),
+              ("ids", np.array([feature_map[names[i]] for i in order], dtype=np.int32)),
+              ("offsets", offsets),
+              ("strings", np.frombuffer(b"".join(encoded), dtype=np.uint8))]
+    for name, values in arrays:
+        replace_file(os.path.join(store_dir, name + ".npy"), lambda f: np.save(f, values))
+    meta = {"version": STORE_VERSION, "count": len(names),
+            "num_features": max(feature_map.values()) + 1 if feature_map else 0,
+            "source_hash": file_hash(feature_map_file), "source_size": stat.st_size, "source_mtime": stat.st_mtime}
+    write_json(os.path.join(store_dir, "meta.json"), meta)
+    return store_dir
+
+
+class CompiledFeatureMap(object):
+    # read only feature name -> id map over memory mapped arrays, nothing is
+    # turned into a python dict
+    def __init__(self, store_dir):
+        with open(os.path.join(store_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.hashes = np.load(os.path.join(store_dir, "hashes.npy"), mmap_mode='r')
+        self.ids = np.load(os.path.join(store_dir, "ids.npy"), mmap_mode='r')
+        self.offsets = np.load(os.path.join(store_dir, "offsets.npy"), mmap_mode='r')
+        self.strings = np.load(os.path.join(store_dir, "strings.npy"), mmap_mode='r')
+
+    def __len__(self):
+        return self.meta["num_features"]
+
+    def name_at(self, i):
+        return self.strings[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def lookup(self, names):
+        # ids of names, -1 for the ones not in the map
+        if not len(self.hashes):
+            return [-1] * len(names)
+        wanted = np.array([feature_hash(name) for name in names], dtype=np.uint64)
+        positions = np.searchsorted(self.hashes, wanted).tolist()
+        result = []
+        for name, h, i in zip(names, wanted.tolist(), positions):
+            found = -1
+            while i < len(self.hashes) and int(self.hashes[i]) == h:
+                if self.name_at(i) == name:
+                    found = int(self.ids[i])
+                    break
+                i += 1
+            result.append(found)
+        return result
+
+    def get(self, name, default=None):
+        found = self.lookup([name])[0]
+        return default if found < 0 else found
+
+    def __contains__(self, name):
+        return self.lookup([name])[0] >= 0
+
+    def __getitem__(self, name):
+        found = self.lookup([name])[0]
+        if found < 0:
+            raise KeyError(name)
+        return found
+
+    def export_text(self, file_name):
+        # same "name id" lines ConvertFeatures writes, in id order
+        with open(file_name, 'w') as f:
+            for i in np.argsort(self.ids, kind="stable").tolist():
+                f.write(self.name_at(i) + " " + str(int(self.ids[i])) + "\n")
+
+
+def store_is_valid(feature_map_file, store_dir):
+    meta_file = os.path.join(store_dir, "meta.json")
+    if not os.path.exists(meta_file):
+        return False
+    with open(meta_file) as f:
+        meta = json.load(f)
+    if meta.get("version") != STORE_VERSION:
+        return False
+    stat = os.stat(feature_map_file)
+    if stat.st_size != meta["source_size"]:
+        return False
+    if stat.st_mtime == meta["source_mtime"]:
+        return True
+    return file_hash(feature_map_file) == meta["source_hash"]
+
+
+def load_feature_map(feature_map_file):
+    store_dir = store_dir_for(feature_map_file)
+    if not os.path.isdir(store_dir):
+        os.makedirs(store_dir, exist_ok=True)
+    with directory_lock(store_dir, False):
+        if store_is_valid(feature_map_file, store_dir):
+            return CompiledFeatureMap(store_dir)
+    with directory_lock(store_dir, True):
+        # another Predict may have compiled it while we waited
+        if not store_is_valid(feature_map_file, store_dir):
+            write_store(feature_map_file, store_dir)
+        return CompiledFeatureMap(store_dir)
+
+
+if __name__ == '__main__':
+    # python feature_map_store.py feature_map_file.txt            compile
+    # python feature_map_store.py feature_map_file.txt out.txt    export the compiled map as text
+    if len(sys.argv) > 2:
+        load_feature_map(sys.argv[1]).export_text(sys.argv[2])
+    else:
+        compile_feature_map(sys.argv[1])
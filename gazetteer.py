@@ -0,0 +1,202 @@
+import os
+import sys
+import json
+from collections import Counter, deque
+import numpy as np
+
+# person / location gazetteer matched with an aho-corasick automaton over tokens,
+# one pass over the sentence whatever the number of entries. it tags like the
+# stanford tagger ([(word, tag)], leftmost longest match, O elsewhere) so it can
+# tag alone, fill the O tags of another tagger, or decide which sentences are
+# worth sending to the tagger.
+GAZETTEER_VERSION = 1
+PERSON = 'PERSON'
+LOCATION = 'LOCATION'
+gazetteer_tags = set([PERSON, LOCATION])
+# entity types of the two arguments of every relation in the annotation files
+relation_argument_tags = {
+    "Live_In": (PERSON, LOCATION),
+    "Work_For": (PERSON, "ORGANIZATION"),
+    "OrgBased_In": ("ORGANIZATION", LOCATION),
+    "Located_In": (LOCATION, LOCATION),
+    "Kill": (PERSON, PERSON),
+}
+
+
+class GazetteerBuilder(object):
+    def __init__(self):
+        self.entries = {}
+
+    def add(self, tokens, tag):
+        # entries without a capitalized token (he, the city) are left out
+        if tag not in gazetteer_tags or not any(w[:1].isupper() for w in tokens):
+            return
+        self.entries.setdefault(tuple(tokens), Counter())[tag] += 1
+
+    def add_annotations(self, file_name):
+        with open(file_name) as f:
+            for line in f:
+                line = line.split("\t")
+                if len(line) > 3 and line[2] in relation_argument_tags:
+                    first_tag, second_tag = relation_argument_tags[line[2]]
+                    self.add(line[1].split(), first_tag)
+                    self.add(line[3].split(), second_tag)
+
+    def add_tagged_sents(self, tagged_sents):
+        # entity spans out of [(word, tag)] sentences, the stanford pickles for example
+        for sent in tagged_sents:
+            i = 0
+            while i < len(sent):
+                j = i + 1
+                while j < len(sent) and sent[j][1] == sent[i][1]:
+                    j += 1
+                if sent[i][1] != 'O':
+                    self.add([w for w, t in sent[i:j]], sent[i][1])
+                i = j
+
+    def add_user_list(self, file_name):
+        # one entry per line: TAG<TAB>entity words
+        with open(file_name) as f:
+            for line in f:
+                line = line.rstrip("\n").split("\t")
+                if len(line) == 2:
+                    self.add(line[1].split(), line[0])
+
+    def build(self):
+        tags = sorted(gazetteer_tags)
+        tag_ids = dict((t, i) for i, t in enumerate(tags))
+        token_ids = {}
+        goto = {}
+        out_tag = [-1]
+        out_len = [0]
+        for tokens, counts in self.entries.items():
+            node = 0
+            for w in tokens:
+                key = (node << 32) | token_ids.setdefault(w, len(token_ids))
+                if key not in goto:
+                    goto[key] = len(out_tag)
+                    out_tag.append(-1)
+                    out_len.append(out_len[node] + 1)
+                node = goto[key]
+            out_tag[node] = tag_ids[counts.most_common(1)[0][0]]
+
+        # failure links and, for every node, the next node on its failure chain that ends an entry
+        children = [[] for _ in out_tag]
+        for key, child in goto.items():
+            children[key >> 32].append((key & 0xffffffff, child))
+        fail = [0] * len(out_tag)
+        dict_link = [0] * len(out_tag)
+        queue = deque([0])
+        while queue:
+            node = queue.popleft()
+            for token, child in children[node]:
+                if node != 0:
+                    f = fail[node]
+                    while f and ((f << 32) | token) not in goto:
+                        f = fail[f]
+                    fail[child] = goto.get((f << 32) | token, 0)
+                f = fail[child]
+                dict_link[child] = f if out_tag[f] >= 0 else dict_link[f]
+                queue.append(child)
+        return Gazetteer(tags, token_ids, goto, fail, out_tag, out_len, dict_link)
+
+
+class Gazetteer(object):
+    def __init__(self, tags, token_ids, goto, fail, out_tag, out_len, dict_link):
+        self.tags = tags
+        self.token_ids = token_ids
+        self.goto = goto
+        self.fail = fail
+        self.out_tag = out_tag
+        self.out_len = out_len
+        self.dict_link = dict_link
+
+    def __len__(self):
+        return sum(1 for t in self.out_tag if t >= 0)
+
+    def matches(self, tokens):
+        # start -> (end, tag) of the longest entry starting there
+        longest = {}
+        goto, fail, out_tag, out_len, dict_link = self.goto, self.fail, self.out_tag, self.out_len, self.dict_link
+        node = 0
+        for i, w in enumerate(tokens):
+            token = self.token_ids.get(w)
+            if token is None:
+                node = 0
+                continue
+            while node and ((node << 32) | token) not in goto:
+                node = fail[node]
+            node = goto.get((node << 32) | token, 0)
+            m = node if out_tag[node] >= 0 else dict_link[node]
+            while m:
+                start = i - out_len[m] + 1
+                if start not in longest or longest[start][0] < i + 1:
+                    longest[start] = (i + 1, self.tags[out_tag[m]])
+                m = dict_link[m]
+        return longest
+
+    def has_match(self, tokens):
+        return len(self.matches(tokens)) > 0
+
+    def tag(self, tokens):
+        longest = self.matches(tokens)
+        tags = ['O'] * len(tokens)
+        i = 0
+        while i < len(tokens):
+            if i in longest:
+                end, tag = longest[i]
+                tags[i:end] = [tag] * (end - i)
+                i = end
+            else:
+                i += 1
+        return list(zip(tokens, tags))
+
+    def tag_sents(self, sents):
+        return [self.tag(tokens) for tokens in sents]
+
+    def save(self, gazetteer_dir):
+        if not os.path.isdir(gazetteer_dir):
+            os.makedirs(gazetteer_dir)
+        keys = np.fromiter(self.goto.keys(), dtype=np.int64, count=len(self.goto))
+        np.save(os.path.join(gazetteer_dir, "goto_keys.npy"), keys)
+        np.save(os.path.join(gazetteer_dir, "goto_children.npy"),
+                np.fromiter(self.goto.values(), dtype=np.int32, count=len(self.goto)))
+        for name in ("fail", "out_tag", "out_len", "dict_link"):
+            np.save(os.path.join(gazetteer_dir, name + ".npy"), np.array(getattr(self, name), dtype=np.int32))
+        tokens = sorted(self.token_ids, key=self.token_ids.get)
+        with open(os.path.join(gazetteer_dir, "meta.json"), 'w') as f:
+            json.dump({"version": GAZETTEER_VERSION, "tags": self.tags, "tokens": tokens}, f)
+
+    @classmethod
+    def load(cls, gazetteer_dir):
+        with open(os.path.join(gazetteer_dir, "meta.json")) as f:
+            meta = json.load(f)
+        if meta["version"] != GAZETTEER_VERSION:
+            raise IOError("gazetteer %s has version %s" % (gazetteer_dir, meta["version"]))
+        arrays = dict((name, np.load(os.path.join(gazetteer_dir, name + ".npy")).tolist())
+                      for name in ("goto_keys", "goto_children", "fail", "out_tag", "out_len", "dict_link"))
+        token_ids = dict((w, i) for i, w in enumerate(meta["tokens"]))
+        goto = dict(zip(arrays["goto_keys"], arrays["goto_children"]))
+        return cls(meta["tags"], token_ids, goto, arrays["fail"], arrays["out_tag"], arrays["out_len"],
+                   arrays["dict_link"])
+
+
+def build_gazetteer(sources):
+    # .annotations files, .list user lists (TAG<TAB>entity) and stanford pickles
+    builder = GazetteerBuilder()
+    for file_name in sources:
+        if file_name.endswith(".annotations"):
+            builder.add_annotations(file_name)
+        elif file_name.endswith(".list"):
+            builder.add_user_list(file_name)
+        else:
+            from utils import load_from_file
+            builder.add_tagged_sents(load_from_file(file_name).values())
+    return builder.build()
+
+
+if __name__ == '__main__':
+    # python gazetteer.py gazetteer.bin data/TRAIN.annotations stnaford_ner.pickle people.list
+    gazetteer = build_gazetteer(sys.argv[2:])
+    gazetteer.save(sys.argv[1])
+    print("gazetteer with %d entries saved to %s" % (len(gazetteer), sys.argv[1]))
@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import random
+import dynet as dy
+from collections import Counter
+from LSTMs import Bi_LSTM_word_embedding, Bi_LSTM_W_AND_C_embedding
+
+# NER tagger on the BiLSTMs of LSTMs.py, runs in process and gives the same
+# [(word, tag)] output as the stanford tagger so it can be used in its place.
+# it is trained on stanford tags (the pickles) or on the NER column of .processed files.
+UNK = "UUUNKKK"
+UNK_CHAR = "\x00"
+lstm_kind = "word_char"  # "word" for word embeddings only
+word_min_count = 2  # rarer words are trained as UNK
+default_epochs = 5
+stanford_tags = set(['PERSON', 'LOCATION', 'ORGANIZATION'])
+processed_to_stanford = {'ORG': 'ORGANIZATION'}
+
+
+class Vocab(object):
+    def __init__(self, words):
+        self.i2w = list(words)
+        self.w2i = dict((w, i) for i, w in enumerate(self.i2w))
+
+    def size(self):
+        return len(self.i2w)
+
+
+class LstmNerTagger(object):
+    def __init__(self, vw, vt, vc, kind=lstm_kind):
+        self.vw = vw
+        self.vt = vt
+        self.vc = vc
+        self.kind = kind
+        self.unk = vw.w2i[UNK]
+        self.unk_char = vc.w2i[UNK_CHAR]
+        self.model = dy.ParameterCollection()
+        if kind == "word":
+            self.network = Bi_LSTM_word_embedding(self.model, vw.size(), vt.size())
+        else:
+            self.network = Bi_LSTM_W_AND_C_embedding(self.model, vw.size(), vc.size(), vt.size())
+
+    @classmethod
+    def from_tagged_sents(cls, tagged_sents, kind=lstm_kind):
+        counts = Counter(w for sent in tagged_sents for w, t in sent)
+        words = [UNK] + sorted(w for w, c in counts.items() if c >= word_min_count)
+        tags = sorted(set(t for sent in tagged_sents for w, t in sent))
+        chars = [UNK_CHAR] + sorted(set(c for w in counts for c in w) - set([UNK_CHAR]))
+        return cls(Vocab(words), Vocab(tags), Vocab(chars), kind)
+
+    def char_ids(self, word):
+        return [self.vc.w2i.get(c, self.unk_char) for c in word]
+
+    def training_example(self, sent):
+        words = [self.vw.w2i.get(w, self.unk) for w, t in sent]
+        tags = [self.vt.w2i[t] for w, t in sent]
+        if self.kind == "word":
+            return words, tags
+        return [(i, self.char_ids(w)) for i, (w, t) in zip(words, sent)], tags
+
+    def train(self, tagged_sents, epochs=default_epochs, dev=None):
+        trainer = dy.AdamTrainer(self.model)
+        examples = [self.training_example(sent) for sent in tagged_sents if len(sent) > 0]
+        for epoch in range(epochs):
+            random.shuffle(examples)
+            cum_loss = 0.0
+            for words, tags in examples:
+                loss = self.network.build_tagging_graph(words, tags)
+                cum_loss += loss.value()
+                loss.backward()
+                trainer.update()
+            print('Epoch Done [{}], AVG Loss: {:.4f}'.format(epoch + 1, cum_loss / len(examples)))
+            if dev:
+                print('dev accuracy {:.4f}'.format(self.accuracy(dev)))
+
+    def accuracy(self, tagged_sents):
+        good = total = 0
+        for sent, predicted in zip(tagged_sents, self.tag_sents([[w for w, t in sent] for sent in tagged_sents])):
+            good += sum(t == p for (w, t), (_, p) in zip(sent, predicted))
+            total += len(sent)
+        return float(good) / max(total, 1)
+
+    def tag(self, tokens):
+        if len(tokens) == 0:
+            return []
+        sent = [(w, None) for w in tokens]
+        if self.kind == "word":
+            tags = self.network.predict_tags(sent, self.vt, self.vw, self.unk)
+        else:
+            tags = self.network.predict_tags(sent, self.vt, self.vw, self.unk, [self.char_ids(w) for w in tokens])
+        return list(zip(tokens, tags))
+
+    def tag_sents(self, sents):
+        return [self.tag(tokens) for tokens in sents]
+
+    def save(self, model_dir):
+        if not os.path.isdir(model_dir):
+            os.makedirs(model_dir)
+        self.model.save(os.path.join(model_dir, "params"))
+        with open(os.path.join(model_dir, "meta.json"), 'w') as f:
+            json.dump({"kind": self.kind, "words": self.vw.i2w, "tags": self.vt.i2w, "chars": self.vc.i2w}, f)
+
+    @classmethod
+    def load(cls, model_dir):
+        with open(os.path.join(model_dir, "meta.json")) as f:
+            meta = json.load(f)
+        tagger = cls(Vocab(meta["words"]), Vocab(meta["tags"]), Vocab(meta["chars"]), meta["kind"])
+        tagger.model.populate(os.path.join(model_dir, "params"))
+        return tagger
+
+
+def tagged_sents_from_pickle(file_name):
+    # the stanford pickles, sen_num -> [(word, tag)]
+    from utils import load_from_file
+    return [list(tagged) for tagged in load_from_file(file_name).values()]
+
+
+def tagged_sents_from_processed(file_name, location_tags=("GPE",)):
+    # gold NER column of a .processed file, mapped to the stanford tag set
+    from corpus import iter_processed_file
+    tagged_sents = []
+    for sentence in iter_processed_file(file_name):
+        tagged = []
+        for word, tag in sentence.ner_tuples(location_tags):
+            tag = processed_to_stanford.get(tag, tag)
+            tagged.append((word, tag if tag in stanford_tags else 'O'))
+        tagged_sents.append(tagged)
+    return tagged_sents
+
+
+def load_tagged_sents(file_name):
+    if file_name.endswith(".processed"):
+        return tagged_sents_from_processed(file_name)
+    return tagged_sents_from_pickle(file_name)
+
+
+def main(argv):
+    # python lstm_ner.py train model_dir stnaford_ner.pickle data/Corpus.TRAIN.processed ...
+    # python lstm_ner.py tag model_dir data/Corpus.DEV.txt
+    command, model_dir = argv[0], argv[1]
+    if command == "train":
+        tagged_sents = []
+        for file_name in argv[2:]:
+            tagged_sents.extend(load_tagged_sents(file_name))
+        tagger = LstmNerTagger.from_tagged_sents(tagged_sents)
+        tagger.train(tagged_sents)
+        tagger.save(model_dir)
+    else:
+        tagger = LstmNerTagger.load(model_dir)
+        with open(argv[2]) as f:
+            for line in f:
+                sen_num, text = line.rstrip("\n").split("\t")[:2]
+                print(sen_num + "\t" + " ".join("%s/%s" % pair for pair in tagger.tag(text.split())))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -2,6 +2,7 @@ import torch
 import torch.nn as nn
 import dynet as dy
 import numpy as np
+import sampling
 # Device configuration
 where_to_save_model = "files/save_mlp_model"
 
@@ -14,6 +15,7 @@ num_epochs = 600 * 4
 batch_size = 100
 learning_rate = 0.001
 drop_out = 0.3
+positive_weight = 30  # loss weight of the Live_In examples, negatives also get their sampling weight
 
 
 
@@ -75,10 +77,15 @@ def train_MLP(train,test):
     m.populate("files/save_mlp_model_0.328_1000")
     trainer = dy.SimpleSGDTrainer(m, learning_rate)
     # Train the model
-    total_step = len(train)
+    labels = [label for label, vectors in train]
     for epoch in range(num_epochs):
         cum_loss = 0.0
-        for i, (label,vectors) in enumerate(train):
+        # other negatives every epoch, the same ones for the same seed
+        keep, weights = sampling.sample_negatives(labels, random_seed=sampling.seed + epoch)
+        total_step = len(keep)
+        for i, (index, weight) in enumerate(zip(keep, weights)):
+            label, vectors = train[index]
+            weight = float(weight)
             # Move tensors to the configured device
             # labels = label.to(device)
             loss =network.create_network_return_loss(vectors,label)
@@ -86,7 +93,9 @@ def train_MLP(train,test):
             # Backward and optimize
             loss.value()  # need to run loss.value() for the forward prop
             if label:
-                loss = 30 * loss
+                weight *= positive_weight
+            if weight != 1:
+                loss = weight * loss
 
             loss.backward()
             trainer.update()
@@ -97,7 +106,7 @@ def train_MLP(train,test):
                       .format(epoch + 1, num_epochs, i + 1, total_step, cum_loss ))
 
         print('Epoch Done [{}], AVG Loss: {:.4f}'
-              .format(epoch + 1, cum_loss/len(train) ))
+              .format(epoch + 1, cum_loss/total_step ))
                 # Test the model
                 # In test phase, we don't need to compute gradients (for memory efficiency)
         correct = 0
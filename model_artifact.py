@@ -0,0 +1,80 @@
+import os
+import json
+import shutil
+import numpy as np
+from corpus_cache import file_hash, replace_file, write_json, directory_lock
+
+ARTIFACT_VERSION = 1
+
+
+def artifact_dir_for(model_file):
+    return model_file + ".npmodel"
+
+
+def export_model(clf, model_file, feature_map_file, hash_buckets=None):
+    # coef_ as raw float32, the feature map it was trained with and a small json
+    # header, enough to score without sklearn (or its version) being around. files are
+    # replaced, not rewritten, a running Predict keeps the coef.npy it has mapped
+    artifact_dir = artifact_dir_for(model_file)
+    if not os.path.isdir(artifact_dir):
+        os.makedirs(artifact_dir, exist_ok=True)
+    coef = np.asarray(clf.coef_, dtype=np.float32).ravel()
+    meta = {"version": ARTIFACT_VERSION, "intercept": float(np.ravel(clf.intercept_)[0]),
+            "classes": [float(c) for c in clf.classes_], "num_features": int(coef.shape[0]),
+            "hash_buckets": hash_buckets}
+    if os.path.exists(model_file):
+        # the pickle this was exported from, a later pickle written without export makes it stale
+        meta["model_hash"] = file_hash(model_file)
+    with directory_lock(artifact_dir, True):
+        replace_file(os.path.join(artifact_dir, "coef.npy"), lambda f: np.save(f, coef))
+        if feature_map_file is not None:
+            with open(feature_map_file, 'rb') as source:
+                replace_file(feature_map_path(artifact_dir), lambda f: shutil.copyfileobj(source, f))
+            meta["feature_map_hash"] = file_hash(feature_map_file)
+        # meta last, it names the pickle the other files belong to
+        write_json(os.path.join(artifact_dir, "meta.json"), meta)
+    return artifact_dir
+
+
+class LinearModel(object):
+    # the part of LinearSVC Predict needs, over a memory mapped weight vector
+    def __init__(self, coef, intercept, classes, meta):
+        self.coef = coef
+        self.intercept = intercept
+        self.classes_ = np.array(classes)
+        self.meta = meta
+
+    def decision_function(self, matrix):
+        if matrix.shape[1] != self.coef.shape[0]:
+            matrix = matrix[:, :self.coef.shape[0]]
+        return matrix.dot(self.coef) + self.intercept
+
+    def predict(self, matrix):
+        return self.classes_[(self.decision_function(matrix) > 0).astype(int)]
+
+
+def is_current(model_file):
+    # the artifact exists and was exported from this pickle (or there is no pickle to prefer)
+    artifact_dir = artifact_dir_for(model_file)
+    if not os.path.isdir(artifact_dir):
+        return False
+    if not os.path.exists(model_file):
+        return True
+    with open(os.path.join(artifact_dir, "meta.json")) as f:
+        meta = json.load(f)
+    return meta.get("model_hash") == file_hash(model_file)
+
+
+def feature_map_path(artifact_dir):
+    return os.path.join(artifact_dir, "feature_map.txt")
+
+
+def load_model(artifact_dir):
+    # meta and coef.npy of the same export
+    with directory_lock(artifact_dir, False):
+        with open(os.path.join(artifact_dir, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("version") != ARTIFACT_VERSION:
+            raise ValueError("unsupported model artifact version %s in %s" % (meta.get("version"), artifact_dir))
+        coef = np.load(os.path.join(artifact_dir, "coef.npy"), mmap_mode='r')
+    return LinearModel(coef, meta["intercept"], meta["classes"], meta)
@@ -1,6 +1,7 @@
 import pickle
 import evaluate_result
 from utils import *
+from corpus import load_corpus
 
 file_name = "data/Corpus.TRAIN.txt"
 processed_file_name = "data/Corpus.TRAIN.processed"
@@ -21,28 +22,6 @@ def load_from_file(file_name):
     return var
 
 
-def convert_sentences_to_tokens(file_name):
-    sentences = {}
-    last_line_is_blank = True
-    for i,line in enumerate(open(file_name)):
-        line = line.strip().replace("\t"," ").split()
-        if last_line_is_blank:
-            last_line_is_blank = False
-            sen_num = line[-1]
-            sentences[sen_num] = []
-            this_sentence = sentences[sen_num]
-            continue
-        elif len(line) == 0:
-            last_line_is_blank = True
-            continue
-        elif line[0].isdigit():
-            word = line[1]
-            this_sentence.append(word)
-
-    return sentences
-
-
-
 def extract_ner(sen):
     all_ner = []
     i = 0
@@ -102,13 +81,12 @@ def combine_two_sentences(first,second):
     return first
 
 
-def get_path_from_word(file_name = processed_file_name):
-    dict_to_list = list_of_all_sentences_per_word(file_name)
+def get_path_from_word(corpus):
     mega_dict = {}
-    for sen in dict_to_list:
+    for sen in corpus:
         mega_dict[sen] = {}
         this_sen = mega_dict[sen]
-        sentence = dict_to_list[sen]
+        sentence = corpus[sen].rows
         for w_list in sentence:
             original_word = w_list[1]
             index = w_list[0]
@@ -128,26 +106,6 @@ def get_path_from_word(file_name = processed_file_name):
     return mega_dict
 
 
-def list_of_all_sentences_per_word(file_name):
-    path_dict = {} #dict of dict
-    last_line_is_blank = True
-    for i,line in enumerate(open(file_name)):
-        line = line.strip().replace("\t"," ").split()
-        if last_line_is_blank:
-            last_line_is_blank = False
-            sen_num = line[-1]
-            path_dict[sen_num] = []
-            this_sentence = path_dict[sen_num]
-            continue
-        elif len(line) == 0:
-            last_line_is_blank = True
-            continue
-        elif line[0].isdigit():
-            this_sentence.append(line)
-
-
-    return path_dict
-
 def extract_word_from_tuple(tup):
     x = tup[0]
     if " " in x:
@@ -215,10 +173,9 @@ def unique_person_and_location(persons,locations):
 
 def main():
     combined_dict = load_from_file(combind_sentences_pickle)
-    tokens_sentences = convert_sentences_to_tokens(processed_file_name)
-    processed_dict = processed_text_to_dict(processed_file_name)
+    corpus = load_corpus(processed_file_name)
     all_stanford_text= {}
-    word_to_route  = get_path_from_word(processed_file_name)
+    word_to_route  = get_path_from_word(corpus)
     with open(file_name) as f:
         save_all_text = []
         all_sentence_ner_dict = {}
@@ -229,13 +186,13 @@ def main():
             line = line.split("\t")
             sen_num = line[0]
             route_to_root = word_to_route[sen_num]
-            #sen = tokens_sentences[sen_num]
+            #sen = corpus[sen_num].words
             #stanford = all_stanford_text[sen_num]
             #stanford = stanford_extract_ner_from_sen(sen)
             #all_stanford_text[sen_num] = stanford
             #stanford = all_stanford_text[sen_num]
-            combine_processed_and_stanford = combine_two_sentences(stanford.copy(),processed_dict[sen_num])
-            # combine_processed_and_stanford = processed_dict[sen_num]
+            combine_processed_and_stanford = combine_two_sentences(stanford.copy(),corpus[sen_num].ner_tuples())
+            # combine_processed_and_stanford = corpus[sen_num].ner_tuples()
             #combined_dict[sen_num] = combine_processed_and_stanford
 
             ners = extract_ner(combine_processed_and_stanford)
@@ -245,8 +202,8 @@ def main():
             text = sen_num + "\t"
             ner_dict =  all_sentence_ner_dict[line[0]]
             # if sen_num == 'sent1483':
-            #     stanford = stanford_extract_ner_from_sen(tokens_sentences[sen_num])
-            #     combine_processed_and_stanford = combine_two_sentences(stanford, processed_dict[sen_num])
+            #     stanford = stanford_extract_ner_from_sen(corpus[sen_num].words)
+            #     combine_processed_and_stanford = combine_two_sentences(stanford, corpus[sen_num].ner_tuples())
             #     ners = extract_ner(combine_processed_and_stanford)
             #     ner_dict = check_person_and_location(ners)
             #     print(1)
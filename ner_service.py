@@ -0,0 +1,213 @@
+import sys
+import json
+import socket
+import threading
+import socketserver
+from queue import Queue
+from concurrent.futures import ThreadPoolExecutor
+
+# long lived NER process. the tagger models are loaded once and kept in a pool,
+# clients talk to it over a local socket with one json object per line:
+#   {"id": 1, "op": "tag", "sents": [["John", "lives", ...], ...]}
+#   {"id": 2, "op": "ping"}
+# every request is answered with a line holding the same id, answers of one
+# connection may come back out of order so a client can pipeline its requests.
+default_host = "127.0.0.1"
+default_port = 9099
+default_workers = 2
+chunk_size = 100  # sentences per request when a client pipelines a big batch
+
+
+class ServiceError(Exception):
+    pass
+
+
+class OutsideTagger(object):
+    # stand in tagger, tags every word O
+    def tag_sents(self, sents):
+        return [[(w, 'O') for w in sen] for sen in sents]
+
+
+def stanford_tagger_factory():
+    import utils
+    from nltk.tag.stanford import StanfordNERTagger
+    return StanfordNERTagger(utils.stanford_model, utils.stanford_jar)
+
+
+class TaggerPool(object):
+    def __init__(self, tagger_factory, workers):
+        self.workers = workers
+        self.taggers = Queue()
+        for _ in range(workers):
+            self.taggers.put(tagger_factory())
+
+    def tag_sents(self, sents):
+        tagger = self.taggers.get()
+        try:
+            return tagger.tag_sents(sents)
+        finally:
+            self.taggers.put(tagger)
+
+
+class NerRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        write_lock = threading.Lock()
+        pending = []
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line.decode("utf-8"))
+            except ValueError:
+                self.send({"id": None, "error": "bad request"}, write_lock)
+                continue
+            pending = [job for job in pending if not job.done()]
+            pending.append(self.server.executor.submit(self.answer, request, write_lock))
+        for job in pending:
+            job.result()
+
+    def answer(self, request, write_lock):
+        op = request.get("op")
+        if op == "ping":
+            response = {"ok": True, "workers": self.server.pool.workers}
+        elif op == "tag":
+            try:
+                response = {"tags": self.server.pool.tag_sents(request["sents"])}
+            except Exception as e:
+                response = {"error": "%s: %s" % (type(e).__name__, e)}
+        else:
+            response = {"error": "unknown op %s" % op}
+        response["id"] = request.get("id")
+        self.send(response, write_lock)
+
+    def send(self, response, write_lock):
+        data = (json.dumps(response) + "\n").encode("utf-8")
+        with write_lock:
+            try:
+                self.wfile.write(data)
+                self.wfile.flush()
+            except OSError:
+                pass
+
+
+class NerServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, tagger_factory=stanford_tagger_factory, address=(default_host, default_port),
+                 workers=default_workers):
+        self.pool = TaggerPool(tagger_factory, workers)
+        self.executor = ThreadPoolExecutor(workers)
+        socketserver.TCPServer.__init__(self, address, NerRequestHandler)
+
+    def server_close(self):
+        socketserver.TCPServer.server_close(self)
+        self.executor.shutdown(wait=False)
+
+
+def start_in_thread(tagger_factory=OutsideTagger, address=(default_host, 0), workers=default_workers):
+    # server on a background thread, port 0 picks a free port (server.server_address)
+    server = NerServer(tagger_factory, address, workers)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+class NerClient(object):
+    # speaks the line protocol, has the tag / tag_sents methods of the nltk tagger
+    # so it can be used in place of it
+    def __init__(self, address=(default_host, default_port), timeout=600):
+        self.address = address
+        self.timeout = timeout
+        self.sock = None
+        self.next_id = 0
+        self.lock = threading.Lock()  # one connection, threads take turns
+
+    def connect(self):
+        if self.sock is None:
+            try:
+                self.sock = socket.create_connection(self.address, self.timeout)
+            except OSError as e:
+                raise ServiceError("cannot reach ner service at %s:%s: %s" % (self.address + (e,)))
+            self.rfile = self.sock.makefile('rb')
+        return self
+
+    def close(self):
+        if self.sock is not None:
+            self.rfile.close()
+            self.sock.close()
+            self.sock = None
+
+    def request_many(self, requests):
+        with self.lock:
+            return self.send_and_collect(requests)
+
+    def send_and_collect(self, requests):
+        # send everything first, then collect the answers by id
+        self.connect()
+        ids = []
+        lines = []
+        for request in requests:
+            self.next_id += 1
+            request["id"] = self.next_id
+            ids.append(self.next_id)
+            lines.append(json.dumps(request) + "\n")
+        answers = {}
+        try:
+            self.sock.sendall("".join(lines).encode("utf-8"))
+            while len(answers) < len(ids):
+                line = self.rfile.readline()
+                if not line:
+                    raise ServiceError("ner service closed the connection")
+                response = json.loads(line.decode("utf-8"))
+                answers[response["id"]] = response
+        except (OSError, ValueError) as e:
+            self.close()
+            raise ServiceError("ner service request failed: %s" % e)
+        responses = [answers[i] for i in ids]
+        for response in responses:
+            if "error" in response:
+                raise ServiceError(response["error"])
+        return responses
+
+    def ping(self):
+        try:
+            return self.request_many([{"op": "ping"}])[0]["ok"]
+        except ServiceError:
+            return False
+
+    def tag_sents(self, sents):
+        requests = [{"op": "tag", "sents": sents[i:i + chunk_size]} for i in range(0, len(sents), chunk_size)]
+        tagged = []
+        for response in self.request_many(requests):
+            tagged.extend([[tuple(pair) for pair in sen] for sen in response["tags"]])
+        return tagged
+
+    def tag(self, tokens):
+        return self.tag_sents([tokens])[0]
+
+
+def parse_address(address):
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+def main(argv):
+    # python ner_service.py [host:port] [workers] [--fake]
+    fake = "--fake" in argv
+    argv = [a for a in argv if a != "--fake"]
+    address = parse_address(argv[0]) if len(argv) > 0 else (default_host, default_port)
+    workers = int(argv[1]) if len(argv) > 1 else default_workers
+    server = NerServer(OutsideTagger if fake else stanford_tagger_factory, address, workers)
+    print("ner service listening on %s:%s with %d workers" % (server.server_address + (workers,)))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,184 @@
+import os
+import sys
+import json
+import pickle
+import hashlib
+import fcntl
+
+# NER tags keyed by a hash of the token sequence, so the same sentence is tagged
+# once whatever corpus or sentence number it comes with. the store directory holds
+# 16 append only shard files (picked by the first hex digit of the key), one line
+# per sentence:  key<TAB>tag tag tag ...
+# a shard is indexed (key -> offset, values are not parsed) the first time it is
+# used and every sentence is read from disk only when asked for.
+STORE_VERSION = 1
+num_shards = 16
+imported_file = "imported.json"
+
+
+def tokens_key(tokens):
+    return hashlib.blake2b("\x1f".join(tokens).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class Shard(object):
+    def __init__(self, path):
+        self.path = path
+        self.offsets = {}
+        self.reader = None
+        self.writer = None
+        self.pid = None  # reader and writer belong to the process that opened them
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                end = self.index_lines(f, 0)
+            if end != os.path.getsize(path):
+                # a partial last line: another process in the middle of an append, or a run
+                # that died there. writers append under the lock, so once we hold it the
+                # lines that got finished are indexed and only a torn tail is left to drop
+                with open(path, 'r+b') as f:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                    try:
+                        end = self.index_lines(f, end)
+                        f.truncate(end)
+                    finally:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def index_lines(self, f, start):
+        # complete lines from start on, returns where the last one ends
+        f.seek(start)
+        end = start
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            self.offsets[line[:line.index(b"\t")].decode("ascii")] = end
+            end += len(line)
+        return end
+
+    def reopen_after_fork(self):
+        # file descriptors inherited through fork share their offset with the parent
+        if self.pid != os.getpid():
+            self.reader = self.writer = None
+            self.pid = os.getpid()
+
+    def get(self, key):
+        offset = self.offsets.get(key)
+        if offset is None:
+            return None
+        self.reopen_after_fork()
+        if self.reader is None:
+            self.reader = open(self.path, 'rb')
+        self.reader.seek(offset)
+        line = self.reader.readline().decode("utf-8").rstrip("\n")
+        if not line.startswith(key + "\t"):
+            # the offset does not point at this key, treat it as never tagged
+            del self.offsets[key]
+            return None
+        tags = line.split("\t", 1)[1]
+        return tags.split(" ") if tags else []
+
+    def put(self, key, tags):
+        if key in self.offsets:
+            return
+        self.reopen_after_fork()
+        if self.writer is None:
+            # O_APPEND and a lock around every line, several processes can add to one shard
+            self.writer = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        line = ("%s\t%s\n" % (key, " ".join(tags))).encode("utf-8")
+        fcntl.flock(self.writer, fcntl.LOCK_EX)
+        try:
+            offset = os.fstat(self.writer).st_size
+            os.write(self.writer, line)
+        finally:
+            fcntl.flock(self.writer, fcntl.LOCK_UN)
+        self.offsets[key] = offset
+
+    def flush(self):
+        # every line is written with its own os.write, nothing is buffered
+        pass
+
+    def close(self):
+        if self.pid == os.getpid():
+            if self.reader is not None:
+                self.reader.close()
+            if self.writer is not None:
+                os.close(self.writer)
+        self.reader = self.writer = None
+
+
+class NerStore(object):
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        if not os.path.isdir(store_dir):
+            os.makedirs(store_dir)
+        self.shards = [None] * num_shards
+
+    def shard(self, key):
+        i = int(key[0], 16) % num_shards
+        if self.shards[i] is None:
+            self.shards[i] = Shard(os.path.join(self.store_dir, "shard_%02x.tsv" % i))
+        return self.shards[i]
+
+    def get(self, tokens):
+        # (word, tag) list like the stanford tagger output, None if never tagged
+        key = tokens_key(tokens)
+        tags = self.shard(key).get(key)
+        if tags is None:
+            return None
+        assert len(tags) == len(tokens)
+        return list(zip(tokens, tags))
+
+    def __contains__(self, tokens):
+        key = tokens_key(tokens)
+        return key in self.shard(key).offsets
+
+    def put(self, tokens, tagged):
+        key = tokens_key(tokens)
+        self.shard(key).put(key, [tag for word, tag in tagged])
+
+    def flush(self):
+        for shard in self.shards:
+            if shard is not None:
+                shard.flush()
+
+    def close(self):
+        for shard in self.shards:
+            if shard is not None:
+                shard.close()
+
+    def imported(self):
+        path = os.path.join(self.store_dir, imported_file)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def import_pickle(self, pickle_file):
+        # the old sen_num -> [(word, tag)] pickles, skipped when this file was imported already
+        import corpus_cache
+        imported = self.imported()
+        stat = os.stat(pickle_file)
+        name = os.path.abspath(pickle_file)
+        seen = imported.get(name)
+        if seen is not None and seen["size"] == stat.st_size and seen["mtime"] == stat.st_mtime:
+            return
+        source_hash = corpus_cache.file_hash(pickle_file)
+        if seen is None or seen["source_hash"] != source_hash:
+            with open(pickle_file, 'rb') as f:
+                all_tagged = pickle.load(f)
+            for tagged in all_tagged.values():
+                self.put([word for word, tag in tagged], tagged)
+            self.flush()
+            print("imported %d sentences from %s into %s" % (len(all_tagged), pickle_file, self.store_dir))
+        imported[name] = {"version": STORE_VERSION, "size": stat.st_size, "mtime": stat.st_mtime,
+                          "source_hash": source_hash}
+        tmp = os.path.join(self.store_dir, imported_file + ".tmp")
+        with open(tmp, 'w') as f:
+            json.dump(imported, f)
+        os.replace(tmp, os.path.join(self.store_dir, imported_file))
+
+
+if __name__ == '__main__':
+    # python ner_store.py ner_store DEV_STANFORD_NER stnaford_ner.pickle
+    store = NerStore(sys.argv[1])
+    for pickle_file in sys.argv[2:]:
+        store.import_pickle(pickle_file)
+    store.close()
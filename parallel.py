@@ -0,0 +1,58 @@
+import os
+import time
+import multiprocessing
+
+# runs a function over a list of independent items (sentences) in forked worker
+# processes. the workers inherit the loaded corpus, NER tags and feature map from
+# the parent (copy on write) so only the results travel back, and they come back
+# in the order of the items so output files are the same as a serial run.
+chunks_per_worker = 4
+task = None
+
+
+def run_chunk(bounds):
+    start, end = bounds
+    began = time.time()
+    fn, items = task
+    results = [fn(item) for item in items[start:end]]
+    return os.getpid(), time.time() - began, end - start, results
+
+
+def ordered_map(fn, items, workers, stats=None):
+    global task
+    if workers <= 1 or len(items) < 2 or "fork" not in multiprocessing.get_all_start_methods():
+        began = time.time()
+        count = 0
+        for item in items:
+            count += 1
+            yield fn(item)
+        if stats is not None:
+            add_stats(stats, os.getpid(), time.time() - began, count)
+        return
+    chunk_size = max(1, len(items) // (workers * chunks_per_worker))
+    bounds = [(i, min(i + chunk_size, len(items))) for i in range(0, len(items), chunk_size)]
+    task = (fn, items)
+    pool = multiprocessing.get_context("fork").Pool(workers)
+    try:
+        for pid, seconds, count, results in pool.imap(run_chunk, bounds):
+            if stats is not None:
+                add_stats(stats, pid, seconds, count)
+            for result in results:
+                yield result
+    finally:
+        pool.close()
+        pool.join()
+        task = None
+
+
+def add_stats(stats, pid, seconds, count):
+    worker = stats.setdefault(pid, [0, 0, 0.0])
+    worker[0] += 1
+    worker[1] += count
+    worker[2] += seconds
+
+
+def print_stats(stats, what="sentences"):
+    for i, (pid, (chunks, count, seconds)) in enumerate(sorted(stats.items())):
+        print("worker %d (pid %d): %d chunks, %d %s, %.2f s, %.1f ms per item"
+              % (i, pid, chunks, count, what, seconds, 1000.0 * seconds / max(count, 1)))
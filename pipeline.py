@@ -0,0 +1,53 @@
+import time
+import asyncio
+
+# pieces for the staged (reader -> NER -> featurizer -> scorer) prediction pipeline
+# of Predict.find_answer_pipelined. queues are bounded so a slow stage holds back
+# the ones before it, and every queue keeps how deep it was each time an item went in.
+
+
+class MeteredQueue(asyncio.Queue):
+    def __init__(self, name, maxsize):
+        asyncio.Queue.__init__(self, maxsize)
+        self.name = name
+        self.puts = 0
+        self.depth_sum = 0
+        self.max_depth = 0
+        self.blocked = 0
+
+    async def put(self, item):
+        if self.full():
+            self.blocked += 1
+        await asyncio.Queue.put(self, item)
+        depth = self.qsize()
+        self.puts += 1
+        self.depth_sum += depth
+        self.max_depth = max(self.max_depth, depth)
+
+    def report(self):
+        return "queue %-10s %6d puts, mean depth %.2f, max depth %d / %d, producer blocked %d times" % (
+            self.name, self.puts, float(self.depth_sum) / max(self.puts, 1), self.max_depth, self.maxsize,
+            self.blocked)
+
+
+class StageTimes(object):
+    # seconds every stage spent working (or, for NER, waiting on the tagger)
+    def __init__(self):
+        self.seconds = {}
+        self.began = time.time()
+
+    def add(self, stage, began):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + time.time() - began
+
+    def report(self):
+        total = time.time() - self.began
+        lines = ["stage %-10s %.2f s" % (stage, seconds) for stage, seconds in sorted(self.seconds.items())]
+        lines.append("end to end %.2f s" % total)
+        return lines
+
+
+def print_report(queues, times):
+    for queue in queues:
+        print(queue.report())
+    for line in times.report():
+        print(line)
@@ -0,0 +1,74 @@
+import sys
+from corpus import iter_processed_file
+
+# cheap test run before NER tagging and featurization: a sentence can only give
+# a Live_In candidate when it has something that looks like a person and something
+# that looks like a location. hints come from the NER column of the processed file,
+# gazetteer matches and capitalized tokens the NER column left untagged (the
+# stanford tagger may still find an entity there).
+person_tags = set(["PERSON"])
+location_tags = set(["GPE", "LOC", "NORP", "FAC"])
+use_capitalization = True
+use_gazetteer = False
+
+
+def entity_hints(sentence, gazetteer=None):
+    has_person = False
+    has_location = False
+    for ner in sentence.ner:
+        has_person = has_person or ner in person_tags
+        has_location = has_location or ner in location_tags
+    if gazetteer is not None and not (has_person and has_location):
+        for word, tag in gazetteer.tag(sentence.words):
+            has_person = has_person or tag == "PERSON"
+            has_location = has_location or tag == "LOCATION"
+    return has_person, has_location
+
+
+def untagged_capitalized(sentence):
+    # the first word is capitalized anyway
+    return sum(1 for i, (word, ner) in enumerate(zip(sentence.words, sentence.ner))
+               if i > 0 and ner == 'O' and word[:1].isupper())
+
+
+def keep_sentence(sentence, gazetteer=None):
+    has_person, has_location = entity_hints(sentence, gazetteer)
+    missing = (not has_person) + (not has_location)
+    if missing == 0:
+        return True
+    return use_capitalization and untagged_capitalized(sentence) >= missing
+
+
+def filter_sentences(sentences, gazetteer=None, stats=None):
+    for sentence in sentences:
+        keep = keep_sentence(sentence, gazetteer)
+        if stats is not None:
+            stats[keep] = stats.get(keep, 0) + 1
+        if keep:
+            yield sentence
+
+
+def recall_report(processed_file, annotations_file, gazetteer=None):
+    # share of the sentences kept, and of the gold Live_In pairs whose sentence is kept
+    from utils import get_tags_from_annotations
+    gold = get_tags_from_annotations(annotations_file)
+    sentences = kept = gold_pairs = kept_pairs = 0
+    for sentence in iter_processed_file(processed_file):
+        keep = keep_sentence(sentence, gazetteer)
+        pairs = sum(1 for per, loc in gold.get(sentence.sen_num, []) if per)
+        sentences += 1
+        kept += keep
+        gold_pairs += pairs
+        kept_pairs += pairs if keep else 0
+    print("sentences kept %d / %d (%.3f)" % (kept, sentences, float(kept) / max(sentences, 1)))
+    print("gold pairs kept %d / %d, recall %.4f" % (kept_pairs, gold_pairs, float(kept_pairs) / max(gold_pairs, 1)))
+    return float(kept_pairs) / max(gold_pairs, 1)
+
+
+if __name__ == '__main__':
+    # python prefilter.py data/Corpus.DEV.processed data/DEV.annotations [gazetteer.bin]
+    gazetteer = None
+    if len(sys.argv) > 3:
+        from gazetteer import Gazetteer
+        gazetteer = Gazetteer.load(sys.argv[3])
+    recall_report(sys.argv[1], sys.argv[2], gazetteer)
@@ -0,0 +1,58 @@
+import numpy as np
+
+# most training candidates are not Live_In. negatives are kept at negative_rate and the
+# ones kept stand for the ones dropped through their weight (1 / the chance they had to
+# be kept), so the weighted loss is still the loss of the full set. part of the kept
+# negatives can be the ones a previous model scored highest (hard negatives), those are
+# kept for sure and weigh 1. used by TrainSolver.train and mlp.train_MLP.
+negative_rate = 1.0  # 1 keeps every negative
+hard_negative_share = 0.0  # of the kept negatives, taken by score instead of at random
+hard_negative_model = None  # model file the hard negatives are scored with, e.g. the last saved_model_short
+seed = 0
+
+
+def sample_negatives(labels, rate=None, scores=None, hard_share=None, random_seed=None):
+    # (indices kept in their original order, their weights)
+    rate = negative_rate if rate is None else rate
+    hard_share = hard_negative_share if hard_share is None else hard_share
+    random_seed = seed if random_seed is None else random_seed
+    labels = np.asarray(labels)
+    weights = np.ones(len(labels))
+    if rate >= 1.0:
+        return np.arange(len(labels)), weights
+    negatives = np.nonzero(labels != 1)[0]
+    keep_count = int(round(len(negatives) * rate))
+    hard = np.zeros(0, dtype=int)
+    if scores is not None and hard_share > 0:
+        order = np.argsort(-np.asarray(scores)[negatives], kind="stable")
+        hard = negatives[order[:int(round(keep_count * hard_share))]]
+    rest = np.setdiff1d(negatives, hard)
+    random_count = min(keep_count - len(hard), len(rest))
+    sampled = np.random.RandomState(random_seed).choice(rest, random_count, replace=False)
+    if random_count:
+        weights[sampled] = float(len(rest)) / random_count
+    kept = labels == 1
+    kept[hard] = True
+    kept[sampled] = True
+    keep = np.nonzero(kept)[0]
+    return keep, weights[keep]
+
+
+def previous_model_scores(X, model_file):
+    # decision scores of an earlier model, its feature ids have to be the ones of X
+    # (same feature map order or hashing), columns only one of them has are left out
+    import Predict
+    model = Predict.load_model(model_file)
+    if hasattr(model, "coef_"):
+        coef, intercept = np.ravel(model.coef_), float(np.ravel(model.intercept_)[0])
+    else:
+        coef, intercept = np.asarray(model.coef), model.intercept
+    n = min(len(coef), X.shape[1])
+    return X[:, :n].dot(coef[:n]) + intercept
+
+
+def report(labels, keep):
+    labels = np.asarray(labels)
+    negatives = int((labels != 1).sum())
+    kept_negatives = int((labels[keep] != 1).sum())
+    print("negative sampling kept %d / %d negatives, %d / %d rows" % (kept_negatives, negatives, len(keep), len(labels)))
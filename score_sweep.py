@@ -0,0 +1,108 @@
+import os
+import sys
+import json
+import numpy as np
+import evaluate_result
+
+# decision scores of every candidate Predict scored, written next to the output file:
+# <output>.scores is the raw float32 scores and <output>.candidates the (sentence,
+# person, location) of each one, a line per score in the same order. the sweep puts
+# every cut of the sorted scores against the gold relations at once and picks the
+# F1 best one, Predict can then use it in place of 0 without retraining.
+THRESHOLD_VERSION = 1
+threshold_file = "decision_threshold.json"
+
+
+def sidecar_files(output_file_name):
+    return output_file_name + ".scores", output_file_name + ".candidates"
+
+
+class ScoreWriter(object):
+    def __init__(self, output_file_name):
+        scores_file, candidates_file = sidecar_files(output_file_name)
+        self.scores = open(scores_file, 'wb')
+        self.candidates = open(candidates_file, 'w')
+
+    def add(self, batch):
+        # batch: (candidate, label, score) like Predict.score_candidates returns
+        np.asarray([score for candidate, pred, score in batch], dtype='<f4').tofile(self.scores)
+        self.candidates.write(''.join("\t".join(candidate[:3]) + "\n" for candidate, pred, score in batch))
+
+    def close(self):
+        self.scores.close()
+        self.candidates.close()
+
+
+def load_scores(output_file_name):
+    scores_file, candidates_file = sidecar_files(output_file_name)
+    scores = np.fromfile(scores_file, dtype='<f4').astype(np.float64)
+    with open(candidates_file) as f:
+        keys = [tuple(line.rstrip("\n").split("\t")) for line in f]
+    if len(keys) != len(scores):
+        raise IOError("%s and %s do not match" % (scores_file, candidates_file))
+    return scores, keys
+
+
+def sweep(output_file_name, gold_file_name):
+    # (threshold, prec, recall, f1) of the F1 best cut, and the same at threshold 0
+    scores, keys = load_scores(output_file_name)
+    sentnce_to_relation, gold_items = evaluate_result.gold_file(gold_file_name)
+    # one score per relation the way evaluate_result sees them, the highest when it repeats
+    best = {}
+    for (sen_num, per, loc), score in zip(keys, scores):
+        key = (sen_num, evaluate_result.remove_dot(per), evaluate_result.remove_dot(loc))
+        if key not in best or score > best[key]:
+            best[key] = score
+    relation_scores = np.array(list(best.values()), dtype=np.float64)
+    correct = np.array([(per, loc) in sentnce_to_relation.get(sen_num, ()) for sen_num, per, loc in best], dtype=bool)
+    order = np.argsort(-relation_scores, kind="stable")
+    relation_scores = relation_scores[order]
+    correct = correct[order]
+    # predicting the top k relations, k = 1 .. n
+    tp = np.cumsum(correct)
+    prec = tp / np.arange(1.0, len(tp) + 1)
+    recall = tp / float(max(len(gold_items), 1))
+    f1 = np.where(prec + recall > 0, 2 * prec * recall / np.maximum(prec + recall, 1e-12), 0.0)
+    # a cut can only fall between two different scores
+    cuts = np.nonzero(np.append(relation_scores[1:] != relation_scores[:-1], True))[0]
+    if len(cuts) == 0:
+        return (0.0, 0.0, 0.0, 0.0), (0.0, 0.0, 0.0, 0.0)
+    i = cuts[np.argmax(f1[cuts])]
+    if i + 1 < len(relation_scores):
+        threshold = (relation_scores[i] + relation_scores[i + 1]) / 2
+    else:
+        threshold = relation_scores[i] - 1.0
+    k = int((relation_scores > 0).sum())
+    at_zero = (0.0, prec[k - 1], recall[k - 1], f1[k - 1]) if k else (0.0, 0.0, 0.0, 0.0)
+    return (float(threshold), prec[i], recall[i], f1[i]), at_zero
+
+
+def save_threshold(threshold, f1, model_filename, file_name=threshold_file):
+    import shards
+    with open(file_name, 'w') as f:
+        json.dump({"version": THRESHOLD_VERSION, "threshold": threshold, "f1": f1,
+                   "model": model_filename, "model_hash": shards.model_hash(model_filename)}, f)
+
+
+def load_threshold(model_filename, file_name=threshold_file):
+    # None when there is no threshold for this model
+    import shards
+    if not os.path.exists(file_name):
+        return None
+    with open(file_name) as f:
+        meta = json.load(f)
+    if meta["version"] != THRESHOLD_VERSION or meta["model_hash"] != shards.model_hash(model_filename):
+        print("%s was swept for another model, using 0" % file_name)
+        return None
+    return meta["threshold"]
+
+
+if __name__ == '__main__':
+    # python score_sweep.py SVM_OUTPUT.txt data/DEV.annotations [saved_model_short] [--save]
+    # needs a Predict run with write_scores (python Predict.py ... --scores)
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    (threshold, prec, recall, f1), (_, prec0, recall0, f10) = sweep(args[0], args[1])
+    print("threshold 0:        prec %.4f recall %.4f F1 %.4f" % (prec0, recall0, f10))
+    print("threshold %-9.4f prec %.4f recall %.4f F1 %.4f" % (threshold, prec, recall, f1))
+    if "--save" in sys.argv:
+        save_threshold(threshold, f1, args[2] if len(args) > 2 else "saved_model_short")
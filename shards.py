@@ -0,0 +1,166 @@
+import os
+import sys
+import json
+import hashlib
+import multiprocessing
+import corpus_cache
+import model_artifact
+
+# batch prediction over a corpus split in shards by sentence id. every shard is a
+# clean / processed file pair that can be predicted on its own (another machine,
+# another process), the manifest records the sentence range of every shard and the
+# hashes of the model and feature map, and the merge puts the shard outputs back
+# together in corpus order, after checking they all come from that model.
+MANIFEST_VERSION = 1
+manifest_name = "manifest.json"
+
+
+def iter_processed_blocks(processed_file):
+    # (sentence id, raw lines) of every sentence of a .processed file, lines kept as they are
+    block = []
+    with open(processed_file) as f:
+        for line in f:
+            if line.strip():
+                block.append(line)
+            elif block:
+                yield block[0].split()[-1], block + [line]
+                block = []
+    if block:
+        yield block[0].split()[-1], block + ["\n"]
+
+
+def model_hash(model_filename):
+    # the numpy artifact when it is current, it is what Predict scores with
+    artifact_dir = model_artifact.artifact_dir_for(model_filename)
+    if model_artifact.is_current(model_filename):
+        h = hashlib.sha1()
+        for name in ("meta.json", "coef.npy"):
+            h.update(corpus_cache.file_hash(os.path.join(artifact_dir, name)).encode("ascii"))
+        return h.hexdigest()
+    return corpus_cache.file_hash(model_filename)
+
+
+def feature_map_hash(feature_map_filename):
+    if feature_map_filename is None or not os.path.exists(feature_map_filename):
+        return None
+    return corpus_cache.file_hash(feature_map_filename)
+
+
+def split_corpus(clean_file, processed_file, num_shards, shard_dir, model_filename="saved_model_short",
+                 feature_map_filename="feature_map_file.txt"):
+    if not os.path.isdir(shard_dir):
+        os.makedirs(shard_dir)
+    with open(clean_file) as f:
+        clean_lines = f.readlines()
+    blocks = dict(iter_processed_blocks(processed_file))
+    per_shard = (len(clean_lines) + num_shards - 1) // num_shards
+    shards = []
+    for index in range(num_shards):
+        lines = clean_lines[index * per_shard:(index + 1) * per_shard]
+        if not lines:
+            break
+        sen_nums = [line.split("\t")[0] for line in lines]
+        name = os.path.join(shard_dir, "shard_%03d" % index)
+        with open(name + ".txt", 'w') as f:
+            f.writelines(lines)
+        with open(name + ".processed", 'w') as f:
+            for sen_num in sen_nums:
+                f.writelines(blocks[sen_num])
+        shards.append({"index": index, "clean": name + ".txt", "processed": name + ".processed",
+                       "output": name + ".out", "done": name + ".done.json",
+                       "first_sentence": sen_nums[0], "last_sentence": sen_nums[-1], "sentences": len(sen_nums)})
+    manifest = {"version": MANIFEST_VERSION, "clean": clean_file, "processed": processed_file,
+                "source_hash": corpus_cache.file_hash(clean_file),
+                "model": model_filename, "model_hash": model_hash(model_filename),
+                "feature_map": feature_map_filename, "feature_map_hash": feature_map_hash(feature_map_filename),
+                "shards": shards}
+    manifest_file = os.path.join(shard_dir, manifest_name)
+    with open(manifest_file, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    return manifest_file
+
+
+def load_manifest(manifest_file):
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+    if manifest["version"] != MANIFEST_VERSION:
+        raise IOError("manifest %s has version %s" % (manifest_file, manifest["version"]))
+    return manifest
+
+
+def run_shard(manifest_file, index, model_filename=None, feature_map_filename=None):
+    import Predict
+    manifest = load_manifest(manifest_file)
+    shard = manifest["shards"][index]
+    model_filename = model_filename or manifest["model"]
+    feature_map_filename = feature_map_filename or manifest["feature_map"]
+    Predict.main(clean_input_file_name=shard["clean"], input_file_name=shard["processed"],
+                 model_filename=model_filename, feature_map_filename=feature_map_filename,
+                 output_file_name=shard["output"])
+    done = {"index": index, "model_hash": model_hash(model_filename),
+            "feature_map_hash": feature_map_hash(feature_map_filename),
+            "output_hash": corpus_cache.file_hash(shard["output"])}
+    with open(shard["done"], 'w') as f:
+        json.dump(done, f)
+    return done
+
+
+def merge_shards(manifest_file, output_file_name):
+    manifest = load_manifest(manifest_file)
+    with open(output_file_name, 'w') as out:
+        for shard in manifest["shards"]:
+            if not os.path.exists(shard["done"]):
+                raise IOError("shard %d (%s - %s) has not run" % (shard["index"], shard["first_sentence"],
+                                                                  shard["last_sentence"]))
+            with open(shard["done"]) as f:
+                done = json.load(f)
+            for key in ("model_hash", "feature_map_hash"):
+                if done[key] != manifest[key]:
+                    raise IOError("shard %d ran with another %s" % (shard["index"], key.replace("_hash", "")))
+            if corpus_cache.file_hash(shard["output"]) != done["output_hash"]:
+                raise IOError("output of shard %d changed after it ran" % shard["index"])
+            with open(shard["output"]) as f:
+                out.write(f.read())
+    return output_file_name
+
+
+def run_local(clean_file, processed_file, gold_file, num_shards, shard_dir="shards", workers=None,
+              output_file_name="SVM_OUTPUT.txt"):
+    # every shard in its own process through run_shard, then the same merge as for separate machines
+    import evaluate_result
+    import utils
+    import Predict
+    manifest_file = split_corpus(clean_file, processed_file, num_shards, shard_dir)
+    # import the NER pickle once, before the shard processes read the store. the parent's
+    # store is closed so every shard process opens its own files
+    utils.load_stanford_ner(Predict.DEV_STANFORD_NER)
+    if utils.ner_store is not None:
+        utils.ner_store.close()
+        utils.ner_store = None
+    shards = range(len(load_manifest(manifest_file)["shards"]))
+    pool = multiprocessing.Pool(workers or len(shards), maxtasksperchild=1)
+    try:
+        pool.starmap(run_shard, [(manifest_file, index) for index in shards])
+    finally:
+        pool.close()
+        pool.join()
+    merge_shards(manifest_file, output_file_name)
+    return evaluate_result.main(output_file_name, gold_file)
+
+
+if __name__ == '__main__':
+    # python shards.py split data/Corpus.DEV.txt data/Corpus.DEV.processed 4 shards
+    # python shards.py run shards/manifest.json 2
+    # python shards.py merge shards/manifest.json SVM_OUTPUT.txt data/DEV.annotations
+    # python shards.py local data/Corpus.DEV.txt data/Corpus.DEV.processed data/DEV.annotations 4
+    command, args = sys.argv[1], sys.argv[2:]
+    if command == "split":
+        print(split_corpus(args[0], args[1], int(args[2]), args[3]))
+    elif command == "run":
+        run_shard(args[0], int(args[1]))
+    elif command == "merge":
+        import evaluate_result
+        merge_shards(args[0], args[1])
+        evaluate_result.main(args[1], args[2])
+    elif command == "local":
+        run_local(args[0], args[1], args[2], int(args[3]))
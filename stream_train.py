@@ -0,0 +1,144 @@
+import os
+import sys
+import pickle
+import hashlib
+import itertools
+import collections
+import numpy as np
+from sklearn.linear_model import SGDClassifier
+import corpus_cache
+import ConvertFeatures
+import model_artifact
+import parallel
+import functools
+import svm_approach
+from corpus import iter_processed_file
+from utils import get_tags_from_annotations, load_stanford_ner, iter_stanford_ner, prefilter_sentences, \
+    featurize_workers
+
+# out of core training for annotated sets too big for svm_approach.main. sentences are
+# read from the processed file chunk_sentences at a time, featurized into a hashed
+# matrix of stream_buckets columns (so the weight vector never grows) and fed to an
+# averaged SGD with hinge loss through partial_fit. the model and how far every
+# (clean, processed, annotations) source got are checkpointed, so a run can be resumed and
+# new annotation files can be added to an already trained model.
+CHECKPOINT_VERSION = 1
+stream_buckets = 1 << 20  # used when ConvertFeatures.hash_buckets is not set
+chunk_sentences = 2000
+checkpoint_every = 5  # chunks
+checkpoint_file = "stream_checkpoint.pickle"
+sgd_params = {"loss": "hinge", "alpha": 1e-5, "average": True, "random_state": 0}
+positive_weight = 5.0  # partial_fit has no class_weight='balanced', Live_In pairs are few
+classes = np.array([0.0, 1.0])
+
+
+def source_key(clean_file, processed_file, annotations_file):
+    # the clean file picks the sentences, progress counts sentences of that selection
+    h = hashlib.sha1()
+    for name in (clean_file, processed_file, annotations_file):
+        h.update(corpus_cache.file_hash(name).encode("ascii"))
+    return h.hexdigest()
+
+
+def new_checkpoint(buckets):
+    return {"version": CHECKPOINT_VERSION, "buckets": buckets, "clf": SGDClassifier(**sgd_params),
+            "sources": {}, "chunks": 0, "rows": 0}
+
+
+def load_checkpoint(buckets, file_name=checkpoint_file):
+    if not os.path.exists(file_name):
+        return new_checkpoint(buckets)
+    with open(file_name, 'rb') as f:
+        checkpoint = pickle.load(f)
+    if checkpoint["version"] != CHECKPOINT_VERSION:
+        raise IOError("checkpoint %s has version %s, not %s" % (file_name, checkpoint["version"], CHECKPOINT_VERSION))
+    if checkpoint["buckets"] != buckets:
+        raise IOError("checkpoint %s was trained with %s buckets, not %s" % (file_name, checkpoint["buckets"], buckets))
+    return checkpoint
+
+
+def save_checkpoint(checkpoint, file_name=checkpoint_file):
+    # model and progress in one file, replaced at once so a crash leaves the previous checkpoint
+    with open(file_name + ".tmp", 'wb') as f:
+        pickle.dump(checkpoint, f)
+    os.replace(file_name + ".tmp", file_name)
+
+
+def iter_sentence_chunks(clean_file, processed_file, skip):
+    # the sentences of clean_file, in processed file order, without loading the corpus
+    with open(clean_file) as f:
+        wanted = set(line.split("\t")[0] for line in f)
+    sentences = (sentence for sentence in iter_processed_file(processed_file) if sentence.sen_num in wanted)
+    sentences = itertools.islice(sentences, skip, None)
+    while True:
+        chunk = list(itertools.islice(sentences, chunk_sentences))
+        if not chunk:
+            return
+        yield chunk
+
+
+def chunk_matrix(chunk, correct_annotations, all_stanford_text, feature_map, stats):
+    tagged = list(iter_stanford_ner(list(prefilter_sentences(chunk)), all_stanford_text))
+    featurize = functools.partial(svm_approach.sentence_training_pairs, correct_annotations=correct_annotations)
+    matrix_builder = ConvertFeatures.FeatureMatrixBuilder()
+    for sen_num, rows, cascade_block in parallel.ordered_map(featurize, tagged, featurize_workers, stats):
+        for feature, true_or_not, per, loc in rows:
+            ids, values = ConvertFeatures.feature_row(feature, feature_map)
+            matrix_builder.add_row(ids, true_or_not, values)
+    return matrix_builder.to_csr(len(feature_map))
+
+
+def train_source(checkpoint, clean_file, processed_file, annotations_file, stanford_ner_pickle):
+    key = source_key(clean_file, processed_file, annotations_file)
+    progress = checkpoint["sources"].setdefault(key, {"annotations": annotations_file, "sentences": 0, "done": False})
+    if progress["done"]:
+        print("%s already trained on" % annotations_file)
+        return
+    correct_annotations = collections.defaultdict(list, get_tags_from_annotations(annotations_file))
+    all_stanford_text = load_stanford_ner(stanford_ner_pickle)
+    feature_map = ConvertFeatures.HashingFeatureMap(checkpoint["buckets"])
+    clf = checkpoint["clf"]
+    stats = {}
+    for chunk in iter_sentence_chunks(clean_file, processed_file, progress["sentences"]):
+        X, y = chunk_matrix(chunk, correct_annotations, all_stanford_text, feature_map, stats)
+        if X.shape[0]:
+            clf.partial_fit(X, y, classes=classes, sample_weight=np.where(y == 1, positive_weight, 1.0))
+        progress["sentences"] += len(chunk)
+        checkpoint["chunks"] += 1
+        checkpoint["rows"] += X.shape[0]
+        print("%s: %d sentences, %d rows in total" % (annotations_file, progress["sentences"], checkpoint["rows"]))
+        if checkpoint["chunks"] % checkpoint_every == 0:
+            save_checkpoint(checkpoint)
+    progress["done"] = True
+    save_checkpoint(checkpoint)
+    if featurize_workers > 1:
+        parallel.print_stats(stats)
+
+
+def export(checkpoint, model_file):
+    # the same files TrainSolver.train writes, Predict needs hash_buckets = the checkpoint buckets
+    clf = checkpoint["clf"]
+    if not hasattr(clf, "coef_"):
+        raise ValueError("nothing trained yet")
+    pickle.dump(clf, open(model_file, 'wb'))
+    model_artifact.export_model(clf, model_file, None, checkpoint["buckets"])
+    return model_file
+
+
+def main(sources, model_file="saved_model_stream", stanford_ner_pickle=svm_approach.stanford_ner_pickle,
+         fresh=False):
+    # sources: (clean, processed, annotations) triples, the ones seen before are skipped or resumed
+    buckets = ConvertFeatures.hash_buckets or stream_buckets
+    if fresh and os.path.exists(checkpoint_file):
+        os.remove(checkpoint_file)
+    checkpoint = load_checkpoint(buckets)
+    for clean_file, processed_file, annotations_file in sources:
+        train_source(checkpoint, clean_file, processed_file, annotations_file, stanford_ner_pickle)
+    return export(checkpoint, model_file)
+
+
+if __name__ == '__main__':
+    # python stream_train.py saved_model_stream data/Corpus.TRAIN.txt data/Corpus.TRAIN.processed data/TRAIN.annotations [more triples] [--fresh]
+    # then predict with Predict.main(model_filename="saved_model_stream", feature_map_filename=None, hash_buckets=stream_buckets)
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    main([tuple(args[i:i + 3]) for i in range(1, len(args), 3)], args[0], fresh="--fresh" in sys.argv)
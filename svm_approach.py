@@ -1,8 +1,12 @@
 import evaluate_result
 from utils import *
+from corpus import load_corpus
 import ConvertFeatures
 import TrainSolver
 import Predict
+import cascade
+import parallel
+import functools
 
 save_feature_here = "memm-features"
 file_name = "data/Corpus.TRAIN.txt"
@@ -12,60 +16,9 @@ file_name_for_all_ner = "all_ner_file_dict.pickle"
 stanford_ner_pickle = "stnaford_ner.pickle"
 combind_sentences_pickle = "combined_dict.pickle"
 Mr_Mrs = set(['Mrs.', 'Ms.'])
+location_tags = ("GPE", "NORP")
 DEBUG = False
-
-def convert_sentences_to_tokens(file_name):
-    sentences = {}
-    last_line_is_blank = True
-    for i, line in enumerate(open(file_name)):
-        line = line.strip().replace("\t", " ").split()
-        if last_line_is_blank:
-            last_line_is_blank = False
-            sen_num = line[-1]
-            sentences[sen_num] = []
-            this_sentence = sentences[sen_num]
-            continue
-        elif len(line) == 0:
-            last_line_is_blank = True
-            continue
-        elif line[0].isdigit():
-            word = line[1]
-            this_sentence.append(word)
-
-    return sentences
-
-
-def processed_text_to_dict(file_name):
-    sentence_dict = {}
-    last_line_is_blank = True
-    for i, line in enumerate(open(file_name)):
-        line = line.strip().replace("\t", " ").split()
-        if last_line_is_blank:
-            last_line_is_blank = False
-            sen_num = line[-1]
-            sentence_dict[sen_num] = sentence_dict.get(sen_num, list())
-            this_sentence = sentence_dict[sen_num]
-            continue
-        elif len(line) == 0:
-            last_line_is_blank = True
-            continue
-        elif line[0].isdigit():
-            word = line[1]
-            ner = line[-1]
-            if ner == "GPE" or ner == "NORP": ner = "LOCATION"
-            # if ner == "GPE": ner = "LOCATION"
-            if line[3] == 'POS':
-                ner = 'O'
-            if ner == person and len(this_sentence) > 0:
-                pre_tup = this_sentence[-1]
-                pre_word = pre_tup[0]
-                if (pre_word == 'Mrs.' or pre_word == 'Ms.'):
-                    this_sentence[-1] = (pre_word, person)
-
-            this_sentence.append((word, ner))
-
-    return sentence_dict
-
+export_feature_text = False  # also write memm-features and vec_file.txt for debugging
 
 def tupple_to_file(file_name, list_of_tupples):
     with open(file_name, 'w') as f:
@@ -84,82 +37,116 @@ def find_closest_location(all_location, person_location):
     return arg_min
 
 
-def main():
-    wrost_case = 0
-    preson_twich = 0
-    location_twich = 0
-
-
+def sentence_training_pairs(tagged, correct_annotations):
+    # features and gold label of every candidate pair of one sentence, runs in the featurize workers
+    sentence, stanford = tagged
+    sen_num = sentence.sen_num
+    context = SentenceContext(sentence)
+
+    this_sentence_proccesed_data = sentence.rows
+    combine_processed_and_stanford = combine_two_sentences(stanford.copy(), sentence.ner_tuples(location_tags),this_sentence_proccesed_data)
+
+    ners = extract_ner(combine_processed_and_stanford)
+    person_location_ner = check_person_and_location(ners)
+
+    if not (person in person_location_ner and location in person_location_ner):
+        return sen_num, [], None
+    possiable_persons, possiable_location = unique_person_and_location(person_location_ner[person], person_location_ner[location])
+    # for k_p,p in possiable_persons.items():
+    #     for k_p,l in possiable_location.items():
+    #         if len(p) > 1 and len(l) > 1:
+    #             wrost_case +=1
+    #         elif len(p) > 1:
+    #             preson_twich +=1
+    #         elif len(l) > 1:
+    #             location_twich += 1
+    #             print(line[1])
+    # print(wrost_case, preson_twich, location_twich)
+
+    sentence_pairs = []
+    rows = []
+    for per in possiable_persons:
+        for loc in possiable_location:
+            per_tup, loc_tup = create_nereast_tupple(per,possiable_persons[per],loc,possiable_location[loc])
+            sentence_pairs.append((per_tup, loc_tup, per, loc))
+            feature = extract_feature(per_tup, loc_tup, [possiable_persons[per], possiable_location[loc]], context)
+            true_or_not = tupple_in_annotion(per_tup, loc_tup, correct_annotations[sen_num])
+            rows.append((feature, true_or_not, per_tup[0], loc_tup[0]))
+    cascade_block = None
+    if use_cascade:
+        cascade_block = cascade.sentence_pairs_features(possiable_persons, possiable_location, sentence_pairs, sentence)
+    return sen_num, rows, cascade_block
+
+
+def build_training_set():
+    # the CSR training matrix, its feature map, the (sen_num, per, loc) of every row and the cascade blocks
     correct_annotations = get_tags_from_annotations(dev_ann)
 
-    if (load_from_pickle):
-        all_stanford_text = load_from_file(stanford_ner_pickle)
-    else:
-        all_stanford_text = {}
+    all_stanford_text = load_stanford_ner(stanford_ner_pickle)
 
-    tokens_sentences = convert_sentences_to_tokens(processed_file_name)
-    processed_dict = processed_text_to_dict(processed_file_name)
+    corpus = load_corpus(processed_file_name, use_corpus_cache)
     all_txt = []
+    matrix_builder = ConvertFeatures.FeatureMatrixBuilder()
+    feature_map = ConvertFeatures.training_feature_map()
     false_line = []
     fal = pos = 0
-    word_to_route, all_sentence_data = get_path_from_word(processed_file_name)
+    cascade_blocks = []
+    row_keys = []
     with open(file_name) as f:
-        for i, line in enumerate(f):
-            line = line.split("\t")
-            sen_num = line[0]
-            route_to_root = word_to_route[sen_num]
-            if (load_from_pickle):
-                stanford = all_stanford_text[sen_num]
-            else:
-                sen = tokens_sentences[sen_num]
-                stanford = stanford_extract_ner_from_sen(sen)
-                all_stanford_text[sen_num] = stanford
-
-            this_sentence_proccesed_data = all_sentence_data[sen_num]
-            combine_processed_and_stanford = combine_two_sentences(stanford.copy(), processed_dict[sen_num],this_sentence_proccesed_data)
-
-            ners = extract_ner(combine_processed_and_stanford)
-            person_location_ner = check_person_and_location(ners)
-
-            if not (person in person_location_ner and location in person_location_ner):
-                continue
-            possiable_persons, possiable_location = unique_person_and_location(person_location_ner[person], person_location_ner[location])
-            # for k_p,p in possiable_persons.items():
-            #     for k_p,l in possiable_location.items():
-            #         if len(p) > 1 and len(l) > 1:
-            #             wrost_case +=1
-            #         elif len(p) > 1:
-            #             preson_twich +=1
-            #         elif len(l) > 1:
-            #             location_twich += 1
-            #             print(line[1])
-            # print(wrost_case, preson_twich, location_twich)
-
-            for per in possiable_persons:
-                for loc in possiable_location:
-                    per_tup, loc_tup = create_nereast_tupple(per,possiable_persons[per],loc,possiable_location[loc])
-                    feature = extract_feature(per_tup, loc_tup, route_to_root, [possiable_persons[per], possiable_location[loc]],this_sentence_proccesed_data)
-                    true_or_not = tupple_in_annotion(per_tup, loc_tup, correct_annotations[sen_num])
-                    if (DEBUG and len(possiable_persons) * len(possiable_location) == 1):
-                        fal += true_or_not == 0
-                        pos += true_or_not == 1
-                        # print(sen_num)
-                        if (not true_or_not):
-                            false_line.append(line)
-                    txt = convert_to_text(true_or_not, feature)
-                    all_txt.append(txt)
+        lines = dict((line[0], line) for line in (line.split("\t") for line in f))
+        sentences = prefilter_sentences([corpus[sen_num] for sen_num in lines])
+        tagged = []
+        for sentence, stanford in iter_stanford_ner(sentences, all_stanford_text):
+            all_stanford_text[sentence.sen_num] = stanford
+            tagged.append((sentence, stanford))
+    stats = {}
+    featurize = functools.partial(sentence_training_pairs, correct_annotations=correct_annotations)
+    for sen_num, rows, cascade_block in parallel.ordered_map(featurize, tagged, featurize_workers, stats):
+        line = lines[sen_num]
+        for feature, true_or_not, per, loc in rows:
+            row_keys.append((sen_num, per, loc))
+            if (DEBUG and len(rows) == 1):
+                fal += true_or_not == 0
+                pos += true_or_not == 1
+                # print(sen_num)
+                if (not true_or_not):
+                    false_line.append(line)
+            ids, values = ConvertFeatures.feature_row(feature, feature_map, grow=True)
+            matrix_builder.add_row(ids, true_or_not, values)
+            if export_feature_text:
+                all_txt.append(convert_to_text(true_or_not, feature))
+        if cascade_block is not None:
+            cascade_blocks.append(cascade_block)
+    if featurize_workers > 1:
+        parallel.print_stats(stats)
     if (DEBUG_RESULT):
         print("pos ", pos)
         print("fal ", fal)
         for p in false_line:
             print(p)
-    write_to_file(save_feature_here, all_txt)
-    features_vec_file, features_map_file = ConvertFeatures.main(save_feature_here)
-    model_file = TrainSolver.main(features_vec_file)
+    if export_feature_text:
+        write_to_file(save_feature_here, all_txt)
+        write_to_file("vec_file.txt", matrix_builder.to_svmlight_lines())
+    X_train, y_train = matrix_builder.to_csr(len(feature_map))
+    return X_train, y_train, feature_map, row_keys, cascade_blocks
+
+
+def main():
+    X_train, y_train, feature_map, row_keys, cascade_blocks = build_training_set()
+    if ConvertFeatures.hash_buckets:
+        features_map_file = None
+    else:
+        features_map_file = "feature_map_file.txt"
+        ConvertFeatures.write_dict_to_file(features_map_file, feature_map)
+    if use_cascade:
+        cascade.train_on_sentences(cascade_blocks, y_train)
+    model_file = TrainSolver.train(X_train, y_train, feature_map_file=features_map_file,
+                                  hash_buckets=ConvertFeatures.hash_buckets)
     output_file_name = "SVM_OUTPUT.txt"
     clean_input_file_name = "data/Corpus.DEV.txt"
     Predict.main(clean_input_file_name=clean_input_file_name, model_filename=model_file,
-                 feature_map_filename=features_map_file, output_file_name=output_file_name)
+                 feature_map_filename=features_map_file, output_file_name=output_file_name,
+                 hash_buckets=ConvertFeatures.hash_buckets)
     evaluate_result.main(output_file_name, "data/DEV.annotations")
 
 
@@ -0,0 +1,205 @@
+import os
+import sys
+import json
+import time
+import zlib
+import itertools
+import numpy as np
+import scipy.sparse
+from sklearn.base import clone
+from sklearn.svm import LinearSVC
+import corpus_cache
+import ConvertFeatures
+import evaluate_result
+import parallel
+import svm_approach
+import TrainSolver
+import utils
+import prefilter
+
+# cross validated grid search for the SVM of TrainSolver. the training matrix is built
+# once (and kept on disk for the next run), the forked workers share it copy on write,
+# and every grid point is scored like evaluate_result scores a prediction file: the
+# out of fold positive rows are turned back into (sentence, person, location) triples
+# and compared with the Live_In relations of the training annotations.
+TUNE_VERSION = 2  # bump when svm_approach featurizes differently
+tune_matrix_file = "tune_matrix.npz"
+tune_rows_file = "tune_rows.json"
+tune_results_file = "tune_results.json"
+folds = 5
+workers = os.cpu_count() or 1
+grid = {"C": [0.05, 0.1, 0.25, 0.5, 1.0, 2.0],
+        "penalty": ['l2', 'l1'],
+        "loss": ['squared_hinge', 'hinge'],
+        "class_weight": [None, 'balanced']}
+shared = None  # (X, y, row_keys, row_folds), set before the pool forks
+
+
+def source_hashes():
+    return dict((name, corpus_cache.file_hash(name)) for name in
+                (svm_approach.file_name, svm_approach.processed_file_name, svm_approach.dev_ann))
+
+
+def directory_hash(directory):
+    if not os.path.isdir(directory):
+        return None
+    return dict((name, corpus_cache.file_hash(os.path.join(directory, name))) for name in sorted(os.listdir(directory)))
+
+
+def ner_settings():
+    # what decides the NER tags, and so the candidates, of the training sentences
+    settings = {"ner_backend": utils.ner_backend, "use_ner_store": utils.use_ner_store,
+                "gazetteer_mode": utils.gazetteer_mode, "stanford_ner_pickle": None, "model": None}
+    if os.path.exists(svm_approach.stanford_ner_pickle):
+        settings["stanford_ner_pickle"] = corpus_cache.file_hash(svm_approach.stanford_ner_pickle)
+    if utils.ner_backend == "lstm":
+        settings["model"] = utils.lstm_model_hash()
+    if utils.ner_backend == "gazetteer" or utils.gazetteer_mode is not None \
+            or (utils.use_prefilter and prefilter.use_gazetteer):
+        settings["gazetteer"] = directory_hash(utils.gazetteer_file)
+    return settings
+
+
+def featurize_settings():
+    return {"hash_buckets": ConvertFeatures.hash_buckets, "location_tags": list(svm_approach.location_tags),
+            "use_prefilter": utils.use_prefilter, "prefilter_capitalization": prefilter.use_capitalization,
+            "prefilter_gazetteer": prefilter.use_gazetteer}
+
+
+def load_training_matrix(rebuild=False):
+    # X, y and the (sen_num, per, loc) of every row, featurized again when the training files
+    # or the NER and featurization settings changed
+    meta = {"version": TUNE_VERSION, "sources": source_hashes(), "ner": ner_settings(),
+            "featurize": featurize_settings()}
+    if not rebuild and os.path.exists(tune_matrix_file) and os.path.exists(tune_rows_file):
+        with open(tune_rows_file) as f:
+            saved = json.load(f)
+        if saved["meta"] == meta:
+            matrix = np.load(tune_matrix_file)
+            X = scipy.sparse.csr_matrix((matrix["data"], matrix["indices"], matrix["indptr"]),
+                                        shape=tuple(matrix["shape"]))
+            return X, matrix["y"], [tuple(key) for key in saved["rows"]]
+    X, y, feature_map, row_keys, cascade_blocks = svm_approach.build_training_set()
+    X = scipy.sparse.csr_matrix(X)
+    np.savez(tune_matrix_file, data=X.data, indices=X.indices, indptr=X.indptr, shape=np.array(X.shape),
+             y=np.asarray(y))
+    with open(tune_rows_file, 'w') as f:
+        json.dump({"meta": meta, "rows": row_keys}, f)
+    return X, np.asarray(y), row_keys
+
+
+def sentence_fold(sen_num, num_folds):
+    # all the candidates of a sentence land in the same fold
+    return zlib.crc32(sen_num.encode("utf-8")) % num_folds
+
+
+def valid_combination(penalty, loss):
+    return not (penalty == 'l1' and loss == 'hinge')
+
+
+def make_classifier(penalty, loss, class_weight):
+    # liblinear supports l1 only in the primal and hinge only in the dual
+    return LinearSVC(penalty=penalty, loss=loss, class_weight=class_weight, dual=penalty == 'l2')
+
+
+def grid_tasks(num_folds):
+    # one task per (penalty, loss, class_weight, fold), it walks the C values from the smallest up
+    tasks = []
+    for penalty, loss, class_weight in itertools.product(grid["penalty"], grid["loss"], grid["class_weight"]):
+        if valid_combination(penalty, loss):
+            for fold in range(num_folds):
+                tasks.append((penalty, loss, class_weight, fold))
+    return tasks
+
+
+def run_task(task):
+    penalty, loss, class_weight, fold = task
+    X, y, row_keys, row_folds = shared
+    test = row_folds == fold
+    X_train, y_train = X[~test], y[~test]
+    X_test = X[test]
+    test_rows = np.nonzero(test)[0]
+    clf = make_classifier(penalty, loss, class_weight)
+    # warm start only when the solver has it, liblinear (LinearSVC) always starts from zero
+    warm = "warm_start" in clf.get_params()
+    if warm:
+        clf.set_params(warm_start=True)
+    results = []
+    for C in sorted(grid["C"]):
+        began = time.time()
+        if not warm:
+            clf = clone(clf)
+        clf.set_params(C=C)
+        if len(np.unique(y_train)) < 2 or X_test.shape[0] == 0:
+            positive = np.zeros(0, dtype=int)
+        else:
+            clf.fit(X_train, y_train)
+            positive = test_rows[clf.decision_function(X_test) > 0]
+        results.append((C, positive, time.time() - began))
+    return task, results
+
+
+def fold_gold(sentnce_to_relation, gold_items, fold, num_folds):
+    items = set(item for item in gold_items if sentence_fold(item[0], num_folds) == fold)
+    relations = dict((sen_num, pairs) for sen_num, pairs in sentnce_to_relation.items()
+                     if sentence_fold(sen_num, num_folds) == fold)
+    return relations, items
+
+
+def tune(num_folds=folds, num_workers=workers, rebuild=False, gold_file_name=None):
+    global shared
+    X, y, row_keys = load_training_matrix(rebuild)
+    print("training matrix %d x %d, %d non zero, %d positive rows" % (X.shape[0], X.shape[1], X.nnz, (y == 1).sum()))
+    sentnce_to_relation, gold_items = evaluate_result.gold_file(gold_file_name or svm_approach.dev_ann)
+    row_folds = np.array([sentence_fold(sen_num, num_folds) for sen_num, per, loc in row_keys], dtype=int)
+    shared = (X, y, row_keys, row_folds)
+    points = {}
+    stats = {}
+    try:
+        for (penalty, loss, class_weight, fold), results in parallel.ordered_map(run_task, grid_tasks(num_folds),
+                                                                                 num_workers, stats):
+            for C, positive, seconds in results:
+                point = points.setdefault((C, penalty, loss, class_weight), {"positive": [], "folds": [], "seconds": 0.0})
+                predicted = [row_keys[i] for i in positive]
+                relations, items = fold_gold(sentnce_to_relation, gold_items, fold, num_folds)
+                point["folds"].append(evaluate_result.score_items(predicted, relations, items)[2])
+                point["positive"].extend(predicted)
+                point["seconds"] += seconds
+    finally:
+        shared = None
+    parallel.print_stats(stats, "fold tasks")
+    report = []
+    for (C, penalty, loss, class_weight), point in points.items():
+        prec, recall, f1 = evaluate_result.score_items(point["positive"], sentnce_to_relation, gold_items)
+        report.append({"C": C, "penalty": penalty, "loss": loss, "class_weight": class_weight,
+                       "prec": prec, "recall": recall, "f1": f1, "fold_f1_std": float(np.std(point["folds"])),
+                       "fit_seconds": point["seconds"]})
+    report.sort(key=lambda r: -r["f1"])
+    print_report(report)
+    with open(tune_results_file, 'w') as f:
+        json.dump({"folds": num_folds, "results": report}, f, indent=1)
+    return report
+
+
+def best_params(report):
+    best = report[0]
+    return {"penalty": best["penalty"], "loss": best["loss"], "class_weight": best["class_weight"],
+            "dual": best["penalty"] == 'l2', "C": best["C"]}
+
+
+def print_report(report):
+    print("%8s %8s %14s %14s %8s %8s %8s %8s %8s" % ("C", "penalty", "loss", "class_weight", "prec", "recall",
+                                                    "F1", "F1 std", "fit s"))
+    for r in report:
+        print("%8g %8s %14s %14s %8.4f %8.4f %8.4f %8.4f %8.2f" % (r["C"], r["penalty"], r["loss"], r["class_weight"],
+                                                                    r["prec"], r["recall"], r["f1"], r["fold_f1_std"],
+                                                                    r["fit_seconds"]))
+    if report:
+        print("best, for TrainSolver.svm_params:", best_params(report))
+        print("current TrainSolver.svm_params:", TrainSolver.svm_params)
+
+
+if __name__ == '__main__':
+    # python tune.py [folds] [workers] [--rebuild]
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    tune(int(args[0]) if args else folds, int(args[1]) if len(args) > 1 else workers, "--rebuild" in sys.argv)
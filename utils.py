@@ -1,11 +1,24 @@
 # Ofer Sabo 201511110 Daniel Ben Itzhak  338017437
-from nltk.tag.stanford import StanfordNERTagger
 from collections import Counter
+import os
 import pickle
-
-st = StanfordNERTagger(
-    '/Users/ofersabo/PycharmProjects/NLP_A4/stanford-ner-2018-10-16/classifiers/english.all.3class.distsim.crf.ser.gz',
-    '/Users/ofersabo/PycharmProjects/NLP_A4/stanford-ner-2018-10-16/stanford-ner.jar')
+from dependency_tree import DependencyTree
+import ner_service
+
+stanford_model = '/Users/ofersabo/PycharmProjects/NLP_A4/stanford-ner-2018-10-16/classifiers/english.all.3class.distsim.crf.ser.gz'
+stanford_jar = '/Users/ofersabo/PycharmProjects/NLP_A4/stanford-ner-2018-10-16/stanford-ner.jar'
+st = None
+ner_service_address = None  # "host:port" of a running ner_service.py, tagging then goes through it
+ner_backend = "stanford"  # "lstm" tags with the BiLSTM tagger of lstm_ner.py, no java needed, "gazetteer" with gazetteer.py
+lstm_ner_model = "lstm_ner_model"
+# None, "merge": gazetteer matches fill the O tags in combine_two_sentences,
+# "prepass": merge and only sentences with a gazetteer match are sent to the tagger
+gazetteer_mode = None
+gazetteer_file = "gazetteer.bin"
+gazetteer = None
+use_prefilter = False  # skip the sentences prefilter.py finds no person and location hint in
+featurize_workers = 1  # processes featurizing sentences in svm_approach and Predict, 1 runs serially
+use_cascade = False  # candidate pairs go through the cascade.py pre-classifier before extract_feature
 
 down = 0
 up = 1
@@ -14,6 +27,11 @@ POS_OF_END = "!!!!END!!!"
 set_of_tags = ['PROPN', 'PRON', 'NOUN']
 Mr_Mrs = set(['Mrs.', 'Ms.'])
 load_from_pickle =True
+use_corpus_cache = True
+ner_batch_size = 500  # sentences per stanford tagger invocation
+use_ner_store = True
+ner_store_dir = "ner_store"
+ner_store = None
 live_in = True
 DEBUG_RESULT = False
 person = 'PERSON'
@@ -26,38 +44,6 @@ else:
 DT_SET = set(["DT"])
 
 
-def processed_text_to_dict(file_name):
-    sentence_dict = {}
-    last_line_is_blank = True
-    for i, line in enumerate(open(file_name)):
-        line = line.strip().replace("\t", " ").split()
-        if last_line_is_blank:
-            last_line_is_blank = False
-            sen_num = line[-1]
-            sentence_dict[sen_num] = sentence_dict.get(sen_num, list())
-            this_sentence = sentence_dict[sen_num]
-            continue
-        elif len(line) == 0:
-            last_line_is_blank = True
-            continue
-        elif line[0].isdigit():
-            word = line[1]
-            ner = line[-1]
-            # if ner == "GPE" or ner == "NORP": ner = "LOCATION"
-            if ner == "GPE": ner = "LOCATION"  # or ner == "NORP": ner = "LOCATION"
-            if line[3] == 'POS':
-                ner = 'O'
-            if ner == person and len(this_sentence) > 0:
-                pre_tup = this_sentence[-1]
-                pre_word = pre_tup[0]
-                if (pre_word == 'Mrs.' or pre_word == 'Ms.'):
-                    this_sentence[-1] = (pre_word, person)
-
-            this_sentence.append((word, ner))
-
-    return sentence_dict
-
-
 def extract_word_from_tuple(tup):
     x = tup[0]
     if " " in x:
@@ -71,112 +57,98 @@ def write_to_file(file_name, list_of_text):
             f.write(s)
 
 
-def extract_ner_inbetween_loc(ele, sen):
-    inbetween = False
-    if sen[int(ele[-1]) - 1][-1] == "GPE":
-        inbetween = True
-
-    return inbetween
+def first_token_index(tup):
+    # entities are (words, index of their last token)
+    return int(tup[1]) - len(tup[0].split()) + 1
 
 
-def extract_ner_inbetween_per(ele, sen):
-    inbetween_per = False
-    if sen[int(ele[-1]) - 1][-1] == person:
-        inbetween_per = True
-
-    return inbetween_per
-
-
-def find_joint_route(per_route, loc_route, this_sentence_proccesed_data):
-    if len(per_route) > len(loc_route):
-        longest = per_route
-        shortest = loc_route
+def find_joint_route(per_index, loc_index, meet, tree):
+    if tree.depth[per_index] > tree.depth[loc_index]:
+        longest = per_index
+        shortest = loc_index
     else:
-        longest = loc_route
-        shortest = per_route
+        longest = loc_index
+        shortest = per_index
 
-    dis = 0
-    inbetween_person, inbetween_loc, had_special_prop = False, False, 0
     route_dependency = []
     route_POS = []
-    for i, ele in enumerate(longest, 1):
-        if ele in set(shortest):
-            dis = i
-            break
-        if i > 1 and not inbetween_person:
-            inbetween_person = extract_ner_inbetween_per(ele, this_sentence_proccesed_data)
-        if i > 1 and not inbetween_loc:
-            inbetween_loc = extract_ner_inbetween_loc(ele, this_sentence_proccesed_data)
-
-        route_dependency.append(ele[1] + str(up))
-        route_POS.append(this_sentence_proccesed_data[int(ele[0]) - 1][3])
-
-    for i, ele in enumerate(shortest, 1):
-        if ele in set(longest):
-            dis += i
-            break
-        if i > 1 and not inbetween_person:
-            inbetween_person = extract_ner_inbetween_per(ele, this_sentence_proccesed_data)
-        if i > 1 and not inbetween_loc:
-            inbetween_loc = extract_ner_inbetween_loc(ele, this_sentence_proccesed_data)
-
-        route_dependency.append(ele[1] + str(down))
-        route_POS.append(this_sentence_proccesed_data[int(ele[0]) - 1][3])
-
+    longest_route = tree.climb(longest, meet)
+    shortest_route = tree.climb(shortest, meet)
+    for ele in longest_route:
+        route_dependency.append(tree.deps[ele] + str(up))
+        route_POS.append(tree.pos[tree.parent[ele]])
+    for ele in shortest_route:
+        route_dependency.append(tree.deps[ele] + str(down))
+        route_POS.append(tree.pos[tree.parent[ele]])
+    dis = len(longest_route) + len(shortest_route) + 2
+
+    inbetween_person = tree.entity_on_path(per_index, loc_index, person, include_lca=False)
+    inbetween_loc = tree.entity_on_path(per_index, loc_index, "GPE", include_lca=False)
     return dis, route_dependency, route_POS, inbetween_person, inbetween_loc
 
 
-def find_length_route(per, loc, route_per_word, this_sentence_proccesed_data):
-    per_word = extract_word_from_tuple(per)
-    loc_word = extract_word_from_tuple(loc)
-    per_route = route_per_word[per_word]
-    loc_route = route_per_word[loc_word]
-    if len(set(per_route).intersection(set(loc_route))) == 0:
+def find_length_route(per, loc, tree):
+    per_index = first_token_index(per)
+    loc_index = first_token_index(loc)
+    meet = tree.lca(per_index, loc_index)
+    # routes stop below the ROOT token, so two words only meeting at ROOT are not connected
+    if meet == -1 or tree.parent[meet] == -1:
         dis = 999
-        route_dependency, route_POS, inbetween_person, inbetween_loc, had_special_prop = [], [], False, False, False
+        route_dependency, route_POS, inbetween_person, inbetween_loc = [], [], False, False
     else:
-        dis, route_dependency, route_POS, inbetween_person, inbetween_loc = find_joint_route(per_route, loc_route,this_sentence_proccesed_data)
+        dis, route_dependency, route_POS, inbetween_person, inbetween_loc = find_joint_route(per_index, loc_index, meet,
+                                                                                            tree)
 
-    # find_father_verb(per, this_sentence_proccesed_data)
     return dis, '_'.join(route_dependency), '_'.join(route_POS), inbetween_person, inbetween_loc
 
 
-def window_around_word(sentence, pos_list, index, k=2):
-    exten = 0
-    while index + exten < k:
-        sentence.insert(0, POS_OF_START)
-        pos_list.insert(0, POS_OF_START)
-        exten += 1
-    window = sentence[index + exten - k:index + exten]
-    pos_window = pos_list[index + exten - k:index + exten]
-
-    while index + 1 > len(sentence) - k:
-        sentence.insert(len(sentence), POS_OF_END)
-        pos_list.insert(len(sentence), POS_OF_END)
-
-    window.extend(sentence[index + 1:index + k + 1])
-    pos_window.extend(pos_list[index + 1:index + k + 1])
-
-    return window, pos_window
-
-
-def feature_per_word(per, this_sentence_proccesed_data, pos_list, less_detailed_than_pos):
+class SentenceContext(object):
+    # everything extract_feature needs that does not depend on the candidate pair,
+    # computed once per sentence and shared by all of its (person, location) pairs
+    def __init__(self, sentence, k=3):
+        self.sentence = sentence
+        self.k = k
+        self.words = sentence.words
+        self.tree = DependencyTree.from_sentence(sentence)
+        self.padded_lemmas = [POS_OF_START] * k + sentence.lemmas + [POS_OF_END] * k
+        self.padded_pos = [POS_OF_START] * k + sentence.pos + [POS_OF_END] * k
+        pos_counter = Counter(sentence.pos)
+        self.pos_counts = [pos_counter[i] for i in set_of_tags]
+        self.verb_signature = "_".join(sorted(
+            [lemma for lemma, coarse in zip(sentence.lemmas, sentence.coarse_pos) if coarse == "VERB"]))
+        self.coarse_pos = sentence.coarse_pos
+        self.coarse_prefixes = {}
+
+    def coarse_prefix(self, end):
+        if end not in self.coarse_prefixes:
+            self.coarse_prefixes[end] = '_'.join(self.coarse_pos[:end])
+        return self.coarse_prefixes[end]
+
+    def window(self, index, length):
+        # k lemmas and POS on each side of the word at index once the entity starting
+        # there is collapsed to one token. padding is done the way window_around_word
+        # did it, the right side ignores the start padding it added.
+        k = self.k
+        exten = max(0, k - index)
+        positions = list(range(index - k, index)) + list(range(index + 1 - exten, index + k + 1 - exten))
+        positions = [t + k if t <= index else t + length - 1 + k for t in positions]
+        lemmas = [self.padded_lemmas[t] for t in positions]
+        pos = [self.padded_pos[t] for t in positions]
+        return lemmas, pos
+
+
+def feature_per_word(per, context):
     fe = []
     PERSON_WORD = per[0]
     length_person = len(PERSON_WORD.split())
     one_before_person = int(per[1]) - length_person
     after_person = int(per[1]) + 1
     word_index = one_before_person + 1
-    lemma_form = [lemma[2] for lemma in this_sentence_proccesed_data.copy()]
-    pos_list_cut = pos_list.copy()
-    for i in range(1, length_person):
-        del (lemma_form[word_index + 1])
-        del (pos_list_cut[word_index + 1])
 
-    assert this_sentence_proccesed_data[one_before_person + 1][1] == PERSON_WORD.split()[0]
-    assert this_sentence_proccesed_data[after_person - 1][1] == PERSON_WORD.split()[-1]
+    assert context.words[one_before_person + 1] == PERSON_WORD.split()[0]
+    assert context.words[after_person - 1] == PERSON_WORD.split()[-1]
 
-    window, pos_window = window_around_word(lemma_form, pos_list_cut, word_index, 3)
+    window, pos_window = context.window(word_index, length_person)
     for ele in window[:int(len(window) / 2)] + pos_window:  # insert into previous words
         fe.append(ele)
 
@@ -188,41 +160,14 @@ def feature_per_word(per, this_sentence_proccesed_data, pos_list, less_detailed_
         for next in window[int(len(window) / 2) + i + 1:]:
             fe.append(pre + "_" + next)
 
-    # for i,pre in enumerate(pos_window[:int(len(pos_window)/2)]):
-    #     for next in pos_window[i+1:int(len(pos_window)/2)]:
-    #         fe.append(pre+"_"+next)
-
     for i, pre in enumerate(pos_window[int(len(pos_window) / 2):]):
         for next in pos_window[int(len(pos_window) / 2) + i + 1:]:
             fe.append(pre + "_" + next)
 
-    # pos_sequence = pos_list[:one_before_person]
-    # fe.append('_'.join(pos_sequence))
-
-    less_d = less_detailed_than_pos[:one_before_person]
-    fe.append('_'.join(less_d))
+    fe.append(context.coarse_prefix(one_before_person))
     return fe, one_before_person
 
 
-def extract_verbs_between_args(this_sentence_proccesed_data, per, loc, verb_list_with_index):
-    PERSON_WORD = per[0]
-    length_person = len(PERSON_WORD.split())
-    one_before_person = int(per[1]) - length_person
-    after_person = int(per[1]) + 1
-
-    loc_word = loc[0]
-    length_location = len(loc_word.split())
-    one_before_location = int(loc[1]) - length_location
-    after_loc = int(loc[1]) + 1
-    verbs_between = []
-    for v in verb_list_with_index[min(after_person, after_loc):max(one_before_person, one_before_location)]:
-        if v[0] == "VERB":
-            verbs_between.append(v[1])
-    verbs = [this_sentence_proccesed_data[int(v) - 1][2] for v in verbs_between]
-    verbs = sorted(verbs)
-    return '_'.join(verbs), len(verbs)
-
-
 '''
 tag Dependency_connection_YES_NO DISTANCE_BETWEEN_WORDS_BY_dependency(if_not_connected_then_999)
  DISTANCE_BETWEEN_WORDS_BY_INDEX    PERSON_WORD 
@@ -239,52 +184,35 @@ tag Dependency_connection_YES_NO DISTANCE_BETWEEN_WORDS_BY_dependency(if_not_con
 
 
 # features =  Dependency_connection_YES_NO , DISTANCE_BETWEEN_WORDS_BY_dependency, lemma form of words in a window size three, less_detailed_than_pos[:one_before_person] ,
-def extract_feature(per, loc, route_to_root, ner_dict, this_sentence_proccesed_data):
-    pos_list = [t[3] for t in this_sentence_proccesed_data]
-    less_detailed_than_pos_with_index = [(t[4], t[0]) for t in this_sentence_proccesed_data]
-    less_detailed_than_pos = [t[4] for t in this_sentence_proccesed_data]
+def extract_feature(per, loc, ner_dict, context):
     fe = []
-    dis, route, pos_route, inbetween_person, inbetween_loc = find_length_route(per, loc,route_to_root,this_sentence_proccesed_data)
-    verbs_between, len_verbs = extract_verbs_between_args(this_sentence_proccesed_data, per, loc,
-                                                          less_detailed_than_pos_with_index)
+    dis, route, pos_route, inbetween_person, inbetween_loc = find_length_route(per, loc, context.tree)
     Dependency_connection_YES_NO = "Yes" if dis < 100 else "No"
     fe.append(Dependency_connection_YES_NO)
     DISTANCE_BETWEEN_WORDS_BY_dependency = dis
     fe.append(DISTANCE_BETWEEN_WORDS_BY_dependency)
 
-    fe_per_word, one_before_per = feature_per_word(per, this_sentence_proccesed_data, pos_list, less_detailed_than_pos)
+    fe_per_word, one_before_per = feature_per_word(per, context)
 
     fe.extend(fe_per_word)
 
-    counter_smaller_than_pos = Counter(pos_list)
-    for i in set_of_tags:
-        fe.append(counter_smaller_than_pos[i])
+    fe.extend(context.pos_counts)
     #
     fe.append(route)
     fe.append(pos_route)
     fe.append(inbetween_person)
     fe.append(inbetween_loc)
 
-    all_verbs = sorted(
-        [t[2] for t in this_sentence_proccesed_data if t[4] == "VERB"])  # item[4] for item in items if item[2]
-    fe.append("_".join(all_verbs))
+    fe.append(context.verb_signature)
     #
-    fe_per_word, one_before_loc = feature_per_word(loc, this_sentence_proccesed_data, pos_list, less_detailed_than_pos)
+    fe_per_word, one_before_loc = feature_per_word(loc, context)
 
     fe.extend(fe_per_word)
 
-    # less_between = less_detailed_than_pos[min(one_before_loc,one_before_per):max(one_before_loc,one_before_per)]
-    # fe.append('_'.join(less_between))
-    # counter_smaller_than_pos = Counter(less_between)
-    # for i in set_of_tags:
-    #     fe.append(counter_smaller_than_pos[i])
-
     DISTANCE_BETWEEN_WORDS_BY_INDEX = abs(one_before_loc - one_before_per)
     fe.append(DISTANCE_BETWEEN_WORDS_BY_INDEX)
 
-    counter_smaller_than_pos = Counter(pos_list)
-    for i in set_of_tags:
-        fe.append(counter_smaller_than_pos[i])
+    fe.extend(context.pos_counts)
 
     fe.append(len(ner_dict))
     fe.append(len(ner_dict))
@@ -310,65 +238,155 @@ def get_tags_from_annotations(file_name_with_annotations="data/TRAIN.annotations
     return sent_annotate
 
 
-def list_of_all_sentences_per_word(file_name):
-    path_dict = {}  # dict of dict
-    last_line_is_blank = True
-    for i, line in enumerate(open(file_name)):
-        line = line.strip().replace("\t", " ").split()
-        if last_line_is_blank:
-            last_line_is_blank = False
-            sen_num = line[-1]
-            path_dict[sen_num] = []
-            this_sentence = path_dict[sen_num]
-            continue
-        elif len(line) == 0:
-            last_line_is_blank = True
-            continue
-        elif line[0].isdigit():
-            this_sentence.append(line)
-
-    return path_dict
-
-
-def get_up_word_data(sentence, current_index):
-    next_data = sentence[int(sentence[current_index][5]) - 1]
-    return next_data
-
-
-def get_path_from_word(file_name):
-    dict_to_list = list_of_all_sentences_per_word(file_name)
-    mega_dict = {}
-    for sen in dict_to_list:
-        mega_dict[sen] = {}
-        this_sen = mega_dict[sen]
-        sentence = dict_to_list[sen]
-        for w_list in sentence:
-            original_word = w_list[1]
-            index = w_list[0]
-            word = original_word
-
-            con = w_list[6]
-            next_index = int(w_list[5])
-            route_to_root = []
-            while con != 'ROOT':
-                route_to_root.append((next_index, con, word, index))
-                word = sentence[next_index - 1][1]
-                index = sentence[next_index - 1][0]
-                con = sentence[next_index - 1][6]
-                next_index = int(sentence[next_index - 1][5])
-
-            this_sen[original_word] = route_to_root
-
-    return mega_dict, dict_to_list
+def get_stanford_tagger():
+    # created on first use, importing nltk also pulls in sklearn
+    global st
+    if st is None and ner_backend == "lstm":
+        import lstm_ner
+        st = lstm_ner.LstmNerTagger.load(lstm_ner_model)
+    if st is None and ner_backend == "gazetteer":
+        st = get_gazetteer()
+    if st is None and ner_service_address is not None:
+        client = ner_service.NerClient(ner_service.parse_address(ner_service_address))
+        if client.ping():
+            st = client
+        else:
+            print("ner service at %s is not answering, using a local tagger" % ner_service_address)
+    if st is None:
+        from nltk.tag.stanford import StanfordNERTagger
+        st = StanfordNERTagger(stanford_model, stanford_jar)
+    return st
 
 
 def stanford_extract_ner_from_sen(sen):
-    r = st.tag(sen)
+    r = get_stanford_tagger().tag(sen)
     return r
 
 
+def stanford_extract_ner_from_sents(sents):
+    # one tagger (java) invocation for all the sentences
+    r = get_stanford_tagger().tag_sents(sents)
+    assert len(r) == len(sents)
+    return r
+
+
+def iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def get_gazetteer():
+    global gazetteer
+    if gazetteer is None:
+        from gazetteer import Gazetteer
+        gazetteer = Gazetteer.load(gazetteer_file)
+    return gazetteer
+
+
+def prefilter_sentences(sentences):
+    if not use_prefilter:
+        return sentences
+    import prefilter
+    return prefilter.filter_sentences(sentences, get_gazetteer() if prefilter.use_gazetteer else None)
+
+
+def lstm_model_hash():
+    # the saved files of lstm_ner_model, a retrained model gets a new store
+    import hashlib
+    from corpus_cache import file_hash
+    h = hashlib.sha1()
+    for name in ("params", "meta.json"):
+        h.update(file_hash(os.path.join(lstm_ner_model, name)).encode("ascii"))
+    return h.hexdigest()[:12]
+
+
+def ner_store_enabled():
+    # the gazetteer tags a sentence in one pass of an in memory automaton, storing its tags
+    # gains nothing and would keep the tags of an older gazetteer.bin
+    return use_ner_store and ner_backend != "gazetteer"
+
+
+def get_ner_store():
+    global ner_store
+    if ner_store is None:
+        import ner_store as store_module
+        # tags of every backend are kept apart, and lstm tags of every saved model too
+        if ner_backend == "lstm":
+            store_dir = ner_store_dir + ".lstm-" + lstm_model_hash()
+        else:
+            store_dir = ner_store_dir
+        ner_store = store_module.NerStore(store_dir)
+    return ner_store
+
+
+def load_stanford_ner(pickle_file):
+    # tags already computed, keyed by sentence number. with the ner store the pickle is
+    # only imported into it (once) and tags are then read from the store per sentence
+    if ner_backend != "stanford":
+        # the pickles hold stanford tags
+        return {}
+    if ner_store_enabled():
+        if os.path.exists(pickle_file):
+            get_ner_store().import_pickle(pickle_file)
+        return {}
+    if load_from_pickle:
+        return load_from_file(pickle_file)
+    return load_fallback_ner(pickle_file)
+
+
+def lookup_stanford_ner(batch, all_stanford_text):
+    # tags already known for the sentences of batch (ner store, all_stanford_text, no
+    # gazetteer match in prepass mode), None for the ones the tagger has to do
+    store = get_ner_store() if ner_store_enabled() else None
+    tagged = [store.get(sentence.words) if store is not None else None for sentence in batch]
+    tagged = [tags if tags is not None else all_stanford_text.get(sentence.sen_num)
+              for sentence, tags in zip(batch, tagged)]
+    if gazetteer_mode == "prepass":
+        # no gazetteer match, the tagger is skipped and the sentence stays all O
+        for i, sentence in enumerate(batch):
+            if tagged[i] is None and not get_gazetteer().has_match(sentence.words):
+                tagged[i] = [(w, 'O') for w in sentence.words]
+    return tagged
+
+
+def fill_stanford_ner(batch, tagged, missing, new_tags):
+    # tagger output for the missing positions of tagged, also added to the ner store
+    store = get_ner_store() if ner_store_enabled() else None
+    for i, tags in zip(missing, new_tags):
+        tagged[i] = tags
+        if store is not None:
+            store.put(batch[i].words, tags)
+    if store is not None:
+        store.flush()
+
+
+def iter_stanford_ner(sentences, all_stanford_text, batch_size=None):
+    # (sentence, stanford tags) pairs. tags are looked up in the ner store and in
+    # all_stanford_text, the sentences found in neither go to the tagger batch_size
+    # (ner_batch_size when not given) at a time and their tags are added to the store
+    if batch_size is None:
+        batch_size = ner_batch_size
+    for batch in iter_batches(sentences, batch_size):
+        tagged = lookup_stanford_ner(batch, all_stanford_text)
+        missing = [i for i, tags in enumerate(tagged) if tags is None]
+        if missing:
+            fill_stanford_ner(batch, tagged, missing, stanford_extract_ner_from_sents([batch[i].words for i in missing]))
+        for sentence, stanford in zip(batch, tagged):
+            yield sentence, stanford
+
+
 def combine_two_sentences(first, second, this_sentence_proccesed_data):
     assert len(first) == len(second)
+    if gazetteer_mode is not None:
+        for i, (word, tag) in enumerate(get_gazetteer().tag([w for w, t in first])):
+            if first[i][1] == 'O' and tag != 'O':
+                first[i] = (first[i][0], tag)
     for i in range(len(first)):
         first_tuple = first[i]
         second_tuple = second[i]
@@ -466,6 +484,13 @@ def load_from_file(file_name):
     return var
 
 
+def load_fallback_ner(file_name):
+    # when tagging through the ner service the pickled tags are still used where they exist
+    if ner_service_address is not None and os.path.exists(file_name):
+        return load_from_file(file_name)
+    return {}
+
+
 def create_nereast_tupple(per_name,person_indeces,location_name,location_indences):
     min_distance = 999
     for per_index in person_indeces: